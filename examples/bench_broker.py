@@ -0,0 +1,104 @@
+#!env/bin/python
+
+"""
+Benchmark load-balancing broker throughput.
+
+Many REQ clients send requests through ZmqBroker to many workers, each
+client keeps fixed number of requests in flight.
+
+    examples/bench_broker.py --transport=inproc --clients=10 --workers=10
+    examples/bench_broker.py --transport=ipc --clients=10 --workers=10
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+from twisted.internet import reactor
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, rootdir)
+os.chdir(rootdir)
+
+from txzmq import ZmqEndpoint, ZmqFactory, ZmqREQConnection
+from txzmq.broker import ZmqBroker, ZmqBrokerWorkerConnection
+
+
+parser = OptionParser("")
+parser.add_option("-t", "--transport", dest="transport",
+                  help="0MQ transport: inproc or ipc")
+parser.add_option("-c", "--clients", dest="clients", type="int",
+                  help="Number of clients")
+parser.add_option("-w", "--workers", dest="workers", type="int",
+                  help="Number of workers")
+parser.add_option("-f", "--in-flight", dest="inflight", type="int",
+                  help="Number of requests in flight per client")
+parser.add_option("-n", "--requests", dest="requests", type="int",
+                  help="Total number of requests")
+parser.set_defaults(transport="inproc", clients=10, workers=10, inflight=10,
+                    requests=100000)
+
+(options, args) = parser.parse_args()
+
+if options.transport == "inproc":
+    frontend, backend = "inproc://bench-frontend", "inproc://bench-backend"
+else:
+    tmpdir = tempfile.mkdtemp()
+    frontend = "ipc://" + os.path.join(tmpdir, "frontend")
+    backend = "ipc://" + os.path.join(tmpdir, "backend")
+
+zf = ZmqFactory()
+
+
+class Worker(ZmqBrokerWorkerConnection):
+    def gotMessage(self, messageId, message):
+        self.reply(messageId, message)
+
+
+broker = ZmqBroker(zf, ZmqEndpoint("bind", frontend),
+                   ZmqEndpoint("bind", backend))
+workers = [Worker(zf, ZmqEndpoint("connect", backend))
+           for _ in range(options.workers)]
+clients = [ZmqREQConnection(zf, ZmqEndpoint("connect", frontend))
+           for _ in range(options.clients)]
+
+state = {'sent': 0, 'received': 0}
+
+
+def request(client):
+    if state['sent'] >= options.requests:
+        return
+    state['sent'] += 1
+    client.sendMsg(b'x' * 16).addCallback(reply, client)
+
+
+def reply(_, client):
+    state['received'] += 1
+    if state['received'] == options.requests:
+        elapsed = time.time() - state['started']
+        print("%s: %d clients, %d workers, %d requests: %.3f s, "
+              "%.0f req/s" % (options.transport, options.clients,
+                              options.workers, options.requests, elapsed,
+                              options.requests / elapsed))
+        reactor.stop()
+        return
+    request(client)
+
+
+def start():
+    state['started'] = time.time()
+    for client in clients:
+        for _ in range(options.inflight):
+            request(client)
+
+# let workers register with broker
+reactor.callLater(0.2, start)
+reactor.run()
+zf.shutdown()
+
+if options.transport != "inproc":
+    shutil.rmtree(tmpdir)
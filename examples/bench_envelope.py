@@ -0,0 +1,113 @@
+#!env/bin/python
+
+"""
+Microbenchmark of envelope handling on ROUTER and REP hot paths.
+
+Compares current implementation with the legacy one (list.pop(0), list
+slicing and concatenation), reporting time and peak of temporary memory
+allocated (traced by tracemalloc) per message.
+
+    examples/bench_envelope.py --messages=100000
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import tracemalloc
+from optparse import OptionParser
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, rootdir)
+os.chdir(rootdir)
+
+from txzmq import ZmqEndpoint, ZmqFactory, ZmqRouterConnection, \
+    ZmqREPConnection, ZmqDealerConnection
+
+
+parser = OptionParser("")
+parser.add_option("-n", "--messages", dest="messages", type="int",
+                  help="Number of messages")
+parser.add_option("-p", "--parts", dest="parts", type="int",
+                  help="Number of body frames")
+parser.set_defaults(messages=100000, parts=3)
+
+(options, args) = parser.parse_args()
+
+zf = ZmqFactory()
+body = [b'x' * 16] * options.parts
+
+
+class Router(ZmqRouterConnection):
+    def gotMessage(self, senderId, *parts):
+        pass
+
+
+class LegacyRouter(Router):
+    def sendMultipart(self, recipientId, parts, copy=True, track=False):
+        return self.send([recipientId] + list(parts), copy=copy, track=track)
+
+    def messageReceived(self, message):
+        sender_id = message.pop(0)
+        self.gotMessage(sender_id, *message)
+
+
+class REP(ZmqREPConnection):
+    def gotMessage(self, messageId, *messageParts):
+        self.reply(messageId, *messageParts)
+
+
+class LegacyREP(REP):
+    def sendEnvelope(self, envelope, parts, copy=True):
+        self.send(list(envelope) + list(parts), copy=copy)
+
+    def messageReceived(self, message):
+        i = message.index(b'')
+        (routingInfo, msgId, payload) = (
+            message[:i - 1], message[i - 1], message[i + 1:])
+        msgParts = payload[0:]
+        self._gotRequest(tuple(routingInfo), msgId, msgParts, False)
+
+
+def measure(name, func):
+    n = options.messages
+    messages = [[b'peer', b'id%d' % i, b''] + body for i in range(n)]
+
+    started = time.time()
+    for message in messages:
+        func(message)
+    elapsed = time.time() - started
+
+    # peak of temporary allocations, averaged over smaller sample
+    sample = messages[:1000]
+    tracemalloc.start()
+    peak = 0
+    for message in sample:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func(message)
+        peak += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    print("%-28s %8.0f ns/msg %6.0f bytes/msg" % (
+        name, elapsed / n * 1e9, float(peak) / len(sample)))
+
+
+for cls in (LegacyRouter, Router, LegacyREP, REP):
+    endpoint = "inproc://bench-envelope-" + cls.__name__
+    conn = cls(zf, ZmqEndpoint("bind", endpoint))
+    peer = ZmqDealerConnection(zf, ZmqEndpoint("connect", endpoint),
+                               identity=b'peer')
+
+    if issubclass(cls, ZmqREPConnection):
+        measure(cls.__name__ + ".messageReceived+reply",
+                conn.messageReceived)
+    else:
+        measure(cls.__name__ + ".messageReceived", conn.messageReceived)
+        measure(cls.__name__ + ".sendMultipart",
+                lambda message: conn.sendMultipart(message[0], message[3:]))
+
+    peer.shutdown()
+    conn.shutdown()
+
+zf.shutdown()
@@ -0,0 +1,56 @@
+#!env/bin/python
+
+"""
+Benchmark ZmqREQConnection message ID generation: UUID pool vs.
+prefix + counter IDs (``fastMessageIds``).
+
+    examples/bench_message_ids.py --count=1000000 --in-flight=1000
+
+IDs are allocated in bursts of ``--in-flight`` requests and released
+afterwards, as it happens with many requests outstanding.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+from optparse import OptionParser
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, rootdir)
+os.chdir(rootdir)
+
+from txzmq import ZmqFactory, ZmqREQConnection
+
+
+parser = OptionParser("")
+parser.add_option("-n", "--count", dest="count", type="int",
+                  help="Number of IDs to generate")
+parser.add_option("-i", "--in-flight", dest="inflight", type="int",
+                  help="Number of requests in flight")
+parser.set_defaults(count=1000000, inflight=1000)
+
+(options, args) = parser.parse_args()
+
+
+class FastIdREQConnection(ZmqREQConnection):
+    fastMessageIds = True
+
+
+zf = ZmqFactory()
+
+for connectionClass in (ZmqREQConnection, FastIdREQConnection):
+    connection = connectionClass(zf)
+
+    def requestBurst():
+        ids = [connection._getNextId() for _ in range(options.inflight)]
+        for msgId in ids:
+            connection._releaseId(msgId)
+
+    elapsed = timeit.timeit(requestBurst,
+                            number=options.count // options.inflight)
+    print("%s: %d IDs in %.3f s, %.0f ns/ID" % (
+        connectionClass.__name__, options.count, elapsed,
+        elapsed / options.count * 1e9))
+
+zf.shutdown()
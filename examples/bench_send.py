@@ -0,0 +1,68 @@
+#!env/bin/python
+
+"""
+Benchmark sending bursts of messages over many connections.
+
+Every PUSH connection sends burst of messages in a loop during the same
+reactor iteration, single PULL connection receives them.
+
+    examples/bench_send.py --connections=100 --messages=1000
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+from twisted.internet import reactor
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, rootdir)
+os.chdir(rootdir)
+
+from txzmq import ZmqEndpoint, ZmqFactory, ZmqPushConnection, \
+    ZmqPullConnection
+
+
+parser = OptionParser("")
+parser.add_option("-e", "--endpoint", dest="endpoint", help="0MQ Endpoint")
+parser.add_option("-c", "--connections", dest="connections", type="int",
+                  help="Number of PUSH connections")
+parser.add_option("-n", "--messages", dest="messages", type="int",
+                  help="Number of messages sent by each connection")
+parser.set_defaults(endpoint="inproc://bench-send", connections=100,
+                    messages=1000)
+
+(options, args) = parser.parse_args()
+
+zf = ZmqFactory()
+total = options.connections * options.messages
+
+
+class Puller(ZmqPullConnection):
+    received = 0
+
+    def onPull(self, message):
+        self.received += 1
+        if self.received == total:
+            elapsed = time.time() - self.started
+            print("%d connections, %d messages: %.3f s, %.0f msg/s" % (
+                options.connections, total, elapsed, total / elapsed))
+            reactor.stop()
+
+
+puller = Puller(zf, ZmqEndpoint("bind", options.endpoint))
+pushers = [ZmqPushConnection(zf, ZmqEndpoint("connect", options.endpoint))
+           for _ in range(options.connections)]
+
+
+def start():
+    puller.started = time.time()
+    for _ in range(options.messages):
+        for pusher in pushers:
+            pusher.push(b'x' * 16)
+
+reactor.callWhenRunning(start)
+reactor.run()
+zf.shutdown()
@@ -0,0 +1,73 @@
+#!env/bin/python
+
+"""
+Benchmark dispatching SUB messages to per-topic handlers.
+
+Compares prefix trie (ZmqSubConnection.subscribe with handler) with
+naive scan over all subscribed prefixes.
+
+    examples/bench_topic_trie.py --subscriptions=10000 --messages=100000
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, rootdir)
+os.chdir(rootdir)
+
+from txzmq import ZmqFactory, ZmqSubConnection
+
+
+parser = OptionParser("")
+parser.add_option("-s", "--subscriptions", dest="subscriptions", type="int",
+                  help="Number of subscribed topic prefixes")
+parser.add_option("-n", "--messages", dest="messages", type="int",
+                  help="Number of messages to dispatch")
+parser.set_defaults(subscriptions=10000, messages=100000)
+
+(options, args) = parser.parse_args()
+
+zf = ZmqFactory()
+counts = [0]
+
+
+def handler(message, tag):
+    counts[0] += 1
+
+
+prefixes = [b'market.%05d.' % i for i in range(options.subscriptions)]
+messages = [[prefixes[i * 7919 % len(prefixes)] + b'quote\0payload']
+            for i in range(options.messages)]
+
+
+class NaiveSub(ZmqSubConnection):
+    def gotMessage(self, message, tag):
+        for prefix, prefix_handler in self.naive:
+            if tag.startswith(prefix):
+                prefix_handler(message, tag)
+
+
+naive = NaiveSub(zf)
+naive.naive = []
+trie = ZmqSubConnection(zf)
+for prefix in prefixes:
+    naive.subscribe(prefix)
+    naive.naive.append((prefix, handler))
+    trie.subscribe(prefix, handler)
+
+for name, sub in (("naive scan", naive), ("prefix trie", trie)):
+    counts[0] = 0
+    n = options.messages if sub is trie else options.messages // 100
+    started = time.time()
+    for message in messages[:n]:
+        sub.messageReceived(message)
+    elapsed = time.time() - started
+    assert counts[0] == n
+    print("%-12s %d subscriptions: %10.0f ns/msg" % (
+        name, options.subscriptions, elapsed / n * 1e9))
+
+zf.shutdown()
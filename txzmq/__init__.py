@@ -1,17 +1,32 @@
 """
 ZeroMQ integration into Twisted reactor.
 """
-from txzmq.connection import ZmqConnection, ZmqEndpoint, ZmqEndpointType
+from txzmq.broker import ZmqBroker, ZmqBrokerWorkerConnection
+from txzmq.connection import ZmqConnection, ZmqEndpoint, ZmqEndpointType, \
+    ZmqQueueOverflowError, ZmqQueueOverflowPolicy
 from txzmq.factory import ZmqFactory
-from txzmq.pubsub import ZmqPubConnection, ZmqSubConnection
+from txzmq.lvc import ZmqLastValueCache
+from txzmq.proxy import ZmqProxy
+from txzmq.pubsub import ZmqPubConnection, ZmqSubConnection, \
+    ZmqXPubConnection, ZmqXSubConnection
 from txzmq.pushpull import ZmqPushConnection, ZmqPullConnection
+from txzmq.reliable import ZmqReliablePubConnection, \
+    ZmqReliableSubConnection
 from txzmq.req_rep import ZmqREQConnection, ZmqREPConnection, \
-    ZmqRequestTimeoutError
-from txzmq.router_dealer import ZmqRouterConnection, ZmqDealerConnection
+    ZmqRequestTimeoutError, ZmqUnknownRequestError
+from txzmq.router_dealer import ZmqRouterConnection, ZmqDealerConnection, \
+    ZmqLoadBalancingConnection, ZmqNoPeersError, ZmqPeerSelection, \
+    ZmqWorkerConnection
 
 
 __all__ = ['ZmqConnection', 'ZmqEndpoint', 'ZmqEndpointType', 'ZmqFactory',
            'ZmqPushConnection', 'ZmqPullConnection', 'ZmqPubConnection',
            'ZmqSubConnection', 'ZmqREQConnection', 'ZmqREPConnection',
            'ZmqRouterConnection', 'ZmqDealerConnection',
-           'ZmqRequestTimeoutError']
+           'ZmqRequestTimeoutError', 'ZmqQueueOverflowError',
+           'ZmqQueueOverflowPolicy', 'ZmqUnknownRequestError',
+           'ZmqLoadBalancingConnection', 'ZmqWorkerConnection',
+           'ZmqNoPeersError', 'ZmqPeerSelection', 'ZmqBroker',
+           'ZmqBrokerWorkerConnection', 'ZmqProxy', 'ZmqXPubConnection',
+           'ZmqXSubConnection', 'ZmqLastValueCache',
+           'ZmqReliablePubConnection', 'ZmqReliableSubConnection']
@@ -0,0 +1,338 @@
+"""
+Load-balancing broker between REQ clients and workers.
+"""
+from collections import OrderedDict, deque
+
+from zmq.error import Again
+
+from txzmq.connection import ZmqEndpointType
+from txzmq.router_dealer import ZmqRouterConnection, ZmqWorkerConnection
+
+
+class ZmqBrokerCommand(object):
+    """
+    Commands (first message part) of broker-worker protocol.
+    """
+    ready = b'\x01'
+    """
+    Worker -> broker: worker is ready to handle request.
+    """
+    request = b'\x02'
+    """
+    Broker -> worker: request follows (client ID, message ID, '', data).
+    """
+    reply = b'\x03'
+    """
+    Worker -> broker: reply follows (client ID, message ID, '', data).
+    """
+    heartbeat = b'\x04'
+    """
+    Both directions: peer is alive.
+    """
+    disconnect = b'\x05'
+    """
+    Worker -> broker: worker is going away.
+    """
+
+
+class _ZmqBrokerFrontend(ZmqRouterConnection):
+    """
+    Broker socket facing clients.
+    """
+
+    def __init__(self, broker, *args, **kwargs):
+        self.broker = broker
+        ZmqRouterConnection.__init__(self, *args, **kwargs)
+
+    def messageReceived(self, message):
+        self.broker._clientRequest(message)
+
+
+class _ZmqBrokerBackend(ZmqRouterConnection):
+    """
+    Broker socket facing workers.
+    """
+
+    def __init__(self, broker, *args, **kwargs):
+        self.broker = broker
+        ZmqRouterConnection.__init__(self, *args, **kwargs)
+
+    def messageReceived(self, message):
+        self.broker._workerMessage(message)
+
+    def shutdown(self):
+        self.broker._stopHeartbeats()
+        ZmqRouterConnection.shutdown(self)
+
+
+class ZmqBroker(object):
+    """
+    Load-balancing broker (LRU worker queue).
+
+    Broker accepts requests from :class:`txzmq.ZmqREQConnection` clients
+    on frontend ROUTER socket and passes each request to the least
+    recently used ready worker (:class:`ZmqBrokerWorkerConnection`)
+    connected to backend ROUTER socket. While no workers are ready,
+    requests wait in local queue. Workers and broker exchange heartbeats:
+    workers which haven't been heard of for :attr:`heartbeatLiveness`
+    heartbeat intervals are forgotten, workers which haven't heard of
+    broker reconnect.
+
+    Picking and returning worker is O(1).
+
+    :var heartbeatInterval: interval between heartbeats (seconds)
+    :type heartbeatInterval: float
+    :var heartbeatLiveness: number of missed heartbeats before worker
+        is considered dead
+    :type heartbeatLiveness: int
+    :var maxQueuedRequests: maximum number of requests waiting for ready
+        worker, new requests over the limit are dropped (clients are
+        expected to time out); 0 means no limit
+    :type maxQueuedRequests: int
+    :var frontend: connection facing clients
+    :var backend: connection facing workers
+    :var workers: worker ID -> expiry time for all live workers
+    :type workers: dict
+    :var ready: ready worker IDs, least recently used first
+    :type ready: :class:`collections.OrderedDict`
+    :var requests: requests waiting for ready worker
+    :type requests: :class:`collections.deque`
+    :var requestsDropped: number of requests dropped because of full queue
+    :type requestsDropped: int
+    :var workersExpired: number of workers forgotten because of missed
+        heartbeats
+    :type workersExpired: int
+    """
+    heartbeatInterval = 1.0
+    heartbeatLiveness = 3
+    maxQueuedRequests = 0
+
+    def __init__(self, factory, frontendEndpoint=None, backendEndpoint=None):
+        """
+        Constructor.
+
+        More endpoints could be added via :meth:`addEndpoints` of
+        :attr:`frontend` and :attr:`backend`.
+
+        :param factory: ZeroMQ Twisted factory
+        :type factory: :class:`ZmqFactory`
+        :param frontendEndpoint: endpoint for clients
+        :type frontendEndpoint: :class:`ZmqEndpoint`
+        :param backendEndpoint: endpoint for workers
+        :type backendEndpoint: :class:`ZmqEndpoint`
+        """
+        self.factory = factory
+        self.workers = {}
+        self.ready = OrderedDict()
+        self.requests = deque()
+        self.requestsDropped = 0
+        self.workersExpired = 0
+        self.heartbeat_call = None
+
+        self.frontend = _ZmqBrokerFrontend(self, factory, frontendEndpoint)
+        self.backend = _ZmqBrokerBackend(self, factory, backendEndpoint)
+
+        if self.heartbeatInterval:
+            self.heartbeat_call = factory.reactor.callLater(
+                self.heartbeatInterval, self._heartbeat)
+
+    def shutdown(self):
+        """
+        Shutdown broker connections.
+        """
+        self.frontend.shutdown()
+        self.backend.shutdown()
+
+    def _stopHeartbeats(self):
+        if self.heartbeat_call is not None:
+            if self.heartbeat_call.active():
+                self.heartbeat_call.cancel()
+            self.heartbeat_call = None
+
+    def _expiry(self):
+        return self.factory.reactor.seconds() + \
+            self.heartbeatInterval * self.heartbeatLiveness
+
+    def _clientRequest(self, message):
+        """
+        Request from client: [client ID, message ID, '', data...].
+        """
+        if self.ready:
+            workerId, _ = self.ready.popitem(last=False)
+            self.backend.sendEnvelope((workerId, ZmqBrokerCommand.request),
+                                      message)
+            return
+
+        if self.maxQueuedRequests and \
+                len(self.requests) >= self.maxQueuedRequests:
+            self.requestsDropped += 1
+            return
+
+        self.requests.append(message)
+
+    def _workerMessage(self, message):
+        """
+        Message from worker: [worker ID, command, ...].
+        """
+        workerId, command = message[0], message[1]
+
+        if command == ZmqBrokerCommand.disconnect:
+            self._removeWorker(workerId)
+            return
+
+        known = workerId in self.workers
+        self.workers[workerId] = self._expiry()
+
+        if command == ZmqBrokerCommand.reply:
+            self.frontend.send(message[2:])
+            self._workerReady(workerId)
+        elif command == ZmqBrokerCommand.ready or not known:
+            # heartbeat or connect probe from unknown worker (e.g. new one
+            # or after it was expired) means it's idle
+            self._workerReady(workerId)
+
+    def _workerReady(self, workerId):
+        """
+        Worker is ready: pass it waiting request or put it to ready queue.
+        """
+        if self.requests:
+            self.backend.sendEnvelope(
+                (workerId, ZmqBrokerCommand.request), self.requests.popleft())
+        else:
+            self.ready[workerId] = None
+
+    def _removeWorker(self, workerId):
+        self.workers.pop(workerId, None)
+        self.ready.pop(workerId, None)
+
+    def _heartbeat(self):
+        """
+        Send heartbeats to live workers, expire dead workers.
+        """
+        self.heartbeat_call = self.factory.reactor.callLater(
+            self.heartbeatInterval, self._heartbeat)
+
+        now = self.factory.reactor.seconds()
+        expired = [workerId for workerId, expires in self.workers.items()
+                   if expires <= now]
+        for workerId in expired:
+            self._removeWorker(workerId)
+        self.workersExpired += len(expired)
+
+        for workerId in self.workers:
+            self.backend.send([workerId, ZmqBrokerCommand.heartbeat])
+
+
+class ZmqBrokerWorkerConnection(ZmqWorkerConnection):
+    """
+    Worker connected to :class:`ZmqBroker` backend.
+
+    Worker handles one request at a time: override :meth:`gotMessage`
+    and send reply using :meth:`reply`, after that worker is ready
+    for the next request.
+
+    If nothing comes from broker for :attr:`heartbeatLiveness` heartbeat
+    intervals, broker is considered dead: worker reconnects to its
+    endpoints and announces itself again.
+
+    :var heartbeatInterval: interval between heartbeats sent to broker
+        (seconds), should match :attr:`ZmqBroker.heartbeatInterval`
+    :type heartbeatInterval: float
+    :var heartbeatLiveness: number of missed broker heartbeats before
+        reconnecting, should match :attr:`ZmqBroker.heartbeatLiveness`
+    :type heartbeatLiveness: int
+    :var brokerReconnects: number of reconnects because of missed broker
+        heartbeats
+    :type brokerReconnects: int
+    """
+    heartbeatInterval = 1.0
+    heartbeatLiveness = 3
+
+    def __init__(self, factory, *args, **kwargs):
+        # message ID -> client ID
+        self._clients = {}
+        self.heartbeat_call = None
+        self.brokerReconnects = 0
+        self._brokerSeen = factory.reactor.seconds()
+
+        ZmqWorkerConnection.__init__(self, factory, *args, **kwargs)
+
+        if self.heartbeatInterval:
+            self.heartbeat_call = self.factory.reactor.callLater(
+                self.heartbeatInterval, self._heartbeat)
+
+    def shutdown(self):
+        """
+        Let broker know worker is going away, shutdown connection.
+        """
+        if self.heartbeat_call is not None:
+            self.heartbeat_call.cancel()
+            self.heartbeat_call = None
+
+        try:
+            self.send([ZmqBrokerCommand.disconnect])
+        except Again:
+            # broker isn't connected
+            pass
+
+        ZmqWorkerConnection.shutdown(self)
+
+    def _heartbeat(self):
+        reactor = self.factory.reactor
+        self.heartbeat_call = reactor.callLater(
+            self.heartbeatInterval, self._heartbeat)
+
+        if reactor.seconds() - self._brokerSeen > \
+                self.heartbeatInterval * self.heartbeatLiveness:
+            self._reconnect()
+        else:
+            self.send([ZmqBrokerCommand.heartbeat])
+
+    def _reconnect(self):
+        """
+        Broker is silent: reconnect to broker endpoints.
+        """
+        self.brokerReconnects += 1
+        self._brokerSeen = self.factory.reactor.seconds()
+
+        for endpoint in self.endpoints:
+            if endpoint.type == ZmqEndpointType.connect:
+                self.socket.disconnect(endpoint.address)
+                self.socket.connect(endpoint.address)
+
+        if not self._clients:
+            # busy worker becomes ready when it replies
+            self.announce()
+
+    def announce(self):
+        """
+        Let broker know worker is ready.
+        """
+        self.send([ZmqBrokerCommand.ready])
+
+    def reply(self, messageId, *messageParts):
+        """
+        Send reply to request with specified ``messageId``.
+
+        :param messageId: message ID
+        :param messageParts: message data
+        """
+        clientId = self._clients.pop(messageId)
+        self.sendEnvelope((ZmqBrokerCommand.reply, clientId, messageId, b''),
+                          messageParts)
+
+    def messageReceived(self, message):
+        """
+        Called on incoming message from ZeroMQ.
+
+        :param message: message data
+        """
+        self._brokerSeen = self.factory.reactor.seconds()
+
+        if message[0] != ZmqBrokerCommand.request:
+            # heartbeat
+            return
+
+        clientId, messageId = message[1], message[2]
+        self._clients[messageId] = clientId
+        self.gotMessage(messageId, *message[4:])
@@ -15,3 +15,52 @@ if PY3:  # pragma: no cover
 else:  # pragma: no cover
     def is_nonstr_iter(v):
         return hasattr(v, '__iter__')
+
+
+def is_buffer(v):
+    """
+    Check whether `v` supports buffer protocol (bytes, bytearray,
+    memoryview, NumPy arrays, mmap objects, ...).
+    """
+    try:
+        memoryview(v)
+    except TypeError:
+        return False
+    return True
+
+
+def is_multipart(v):
+    """
+    Check whether message `v` is a sequence of message parts rather than
+    single part (bytes or buffer).
+
+    Lists and tuples are checked first, so common multipart messages
+    don't go through :func:`is_buffer`.
+    """
+    if isinstance(v, (list, tuple)):
+        return True
+    return is_nonstr_iter(v) and not is_buffer(v)
+
+
+def buffer_size(v):
+    """
+    Size of `v` (bytes or any object supporting buffer protocol) in bytes.
+
+    ``memoryview.nbytes`` isn't available on Python 2.
+    """
+    if isinstance(v, binary_string_type):
+        return len(v)
+    view = memoryview(v)
+    size = view.itemsize
+    for dim in view.shape or ():
+        size *= dim
+    return size
+
+
+def to_bytes(v):
+    """
+    Copy `v` (bytes, :class:`zmq.Frame` or other buffer) into bytes.
+    """
+    if isinstance(v, binary_string_type):
+        return v
+    return memoryview(v).tobytes()
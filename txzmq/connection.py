@@ -4,17 +4,19 @@ ZeroMQ connection.
 from collections import deque, namedtuple
 
 from zmq import constants, error
-from zmq import Socket
+from zmq import MessageTracker, Socket
 
 from zope.interface import implementer
 
-from twisted.internet import reactor
-from twisted.internet.interfaces import IFileDescriptor, IReadDescriptor
+from twisted.internet import defer
+from twisted.internet.error import ConnectionDone
+from twisted.internet.interfaces import IConsumer, IFileDescriptor, \
+    IPushProducer, IReadDescriptor
 from twisted.python import log
 
 from zmq import zmq_version_info
 
-from txzmq.compat import is_nonstr_iter
+from txzmq.compat import buffer_size, is_multipart
 
 ZMQ3 = zmq_version_info()[0] >= 3
 
@@ -47,7 +49,34 @@ class ZmqEndpoint(namedtuple('ZmqEndpoint', ['type', 'address'])):
     """
 
 
-@implementer(IReadDescriptor, IFileDescriptor)
+class ZmqQueueOverflowPolicy(object):
+    """
+    Action taken when message is sent, but outgoing queue is full.
+    """
+    dropOldest = "drop-oldest"
+    """
+    Drop the oldest message from the queue.
+    """
+    dropNewest = "drop-newest"
+    """
+    Drop the message being sent.
+    """
+    raiseError = "raise"
+    """
+    Raise :class:`ZmqQueueOverflowError`.
+    """
+
+
+class ZmqQueueOverflowError(error.Again):
+    """
+    Outgoing queue is full, message can't be sent.
+
+    Subclass of :class:`zmq.error.Again`, so code handling EAGAIN
+    from ZeroMQ handles queue overflow as well.
+    """
+
+
+@implementer(IReadDescriptor, IFileDescriptor, IConsumer, IPushProducer)
 class ZmqConnection(object):
     """
     Connection through ZeroMQ, wraps up ZeroMQ socket.
@@ -59,6 +88,11 @@ class ZmqConnection(object):
     reactor: putting polling ZeroMQ file descriptor into reactor,
     processing events, reading data from socket.
 
+    Connection is also a Twisted consumer (producers writing to connection
+    are paused while outgoing queue is not empty, see
+    :meth:`registerProducer`) and a push producer (reading of incoming
+    messages could be paused with :meth:`pauseProducing`).
+
     :var socketType: socket type, from ZeroMQ
     :var allowLoopbackMulticast: is loopback multicast allowed?
     :vartype allowLoopbackMulticast: bool
@@ -84,6 +118,31 @@ class ZmqConnection(object):
     :vartype reconnectInterval: int
     :var reconnectIntervalMax: set maximum reconnection interval
     :vartype reconnectIntervalMax: int
+    :var conflate: if set, ZeroMQ keeps only the last message in incoming
+        and outgoing queues (``ZMQ_CONFLATE``), doesn't support multipart
+        messages and isn't applied to inproc connections by libzmq 4.3
+    :vartype conflate: bool
+    :var recvCopy: if set to False, incoming frames larger than
+        :attr:`recvCopyThreshold` are delivered to :meth:`messageReceived`
+        as :class:`zmq.Frame` objects without copying
+    :vartype recvCopy: bool
+    :var recvCopyThreshold: frames smaller than this size (in bytes) are
+        always copied into `bytes`, even if :attr:`recvCopy` is False
+    :vartype recvCopyThreshold: int
+    :var trackerPollInterval: how often (in seconds) to check whether
+        ZeroMQ has released buffers of messages sent with `track=True`
+    :vartype trackerPollInterval: float
+    :var maxMessagesPerRead: maximum number of messages processed in one
+        call to :meth:`doRead` before yielding to the reactor, 0 means
+        no limit
+    :vartype maxMessagesPerRead: int
+    :var readBudgetHits: number of times :attr:`maxMessagesPerRead` limit
+        was hit
+    :vartype readBudgetHits: int
+    :var messageBatchSize: if set, incoming messages are delivered to
+        :meth:`messagesReceived` in batches of up to that many messages
+        instead of calling :meth:`messageReceived` for each message
+    :vartype messageBatchSize: int
     :var factory: ZeroMQ Twisted factory reference
     :vartype factory: :class:`ZmqFactory`
     :var socket: ZeroMQ Socket
@@ -92,8 +151,27 @@ class ZmqConnection(object):
     :vartype endpoints: list of :class:`ZmqEndpoint`
     :var fd: file descriptor of zmq mailbox
     :vartype fd: int
+    :var queueOutgoing: if set, messages which can't be sent right away
+        (HWM is reached) are queued and sent as soon as ZeroMQ socket becomes
+        writable, otherwise :meth:`send` raises exception from ZeroMQ
+    :vartype queueOutgoing: bool
+    :var queueMaxMessages: maximum number of messages in outgoing queue,
+        0 means no limit
+    :vartype queueMaxMessages: int
+    :var queueMaxBytes: maximum total size of messages in outgoing queue,
+        0 means no limit
+    :vartype queueMaxBytes: int
+    :var queueOverflowPolicy: what to do when outgoing queue is full, one of
+        :class:`ZmqQueueOverflowPolicy` values
     :var queue: output message queue
     :vartype queue: deque
+    :var queueBytes: total size of messages in output queue
+    :vartype queueBytes: int
+    :var queueDropped: number of messages dropped because of queue overflow
+    :vartype queueDropped: int
+    :var producer: producer registered with :meth:`registerProducer`
+    :var readingPaused: is reading of incoming messages paused?
+    :vartype readingPaused: bool
     """
 
     socketType = None
@@ -111,6 +189,21 @@ class ZmqConnection(object):
     reconnectInterval = 100
     reconnectIntervalMax = 0
 
+    conflate = False
+
+    recvCopy = True
+    recvCopyThreshold = 65536
+
+    trackerPollInterval = 0.01
+
+    maxMessagesPerRead = 0
+    messageBatchSize = 0
+
+    queueOutgoing = False
+    queueMaxMessages = 10000
+    queueMaxBytes = 0
+    queueOverflowPolicy = ZmqQueueOverflowPolicy.raiseError
+
     def __init__(self, factory, endpoint=None, identity=None):
         """
         Constructor.
@@ -131,8 +224,17 @@ class ZmqConnection(object):
         self.identity = identity
         self.socket = Socket(factory.context, self.socketType)
         self.queue = deque()
+        self.queueBytes = 0
+        self.queueDropped = 0
         self.recv_parts = []
-        self.read_scheduled = None
+        self.trackers = []
+        self.tracker_poll = None
+        self.readBudgetHits = 0
+        self.producer = None
+        self.streamingProducer = False
+        self.producerPaused = False
+        self.producer_call = None
+        self.readingPaused = False
 
         self.fd = self.socket.get(constants.FD)
         self.socket.set(constants.LINGER, factory.lingerPeriod)
@@ -170,6 +272,9 @@ class ZmqConnection(object):
         if self.identity is not None:
             self.socket.set(constants.IDENTITY, self.identity)
 
+        if self.conflate:
+            self.socket.set(constants.CONFLATE, 1)
+
         if endpoint:
             self.addEndpoints([endpoint])
 
@@ -198,15 +303,39 @@ class ZmqConnection(object):
         self.factory.reactor.removeReader(self)
 
         self.factory.connections.discard(self)
+        self.factory.pendingReads.discard(self)
 
         self.socket.close()
         self.socket = None
 
         self.factory = None
 
-        if self.read_scheduled is not None:
-            self.read_scheduled.cancel()
-            self.read_scheduled = None
+        if self.tracker_poll is not None:
+            self.tracker_poll.cancel()
+            self.tracker_poll = None
+
+        trackers, self.trackers = self.trackers, []
+        for tracker, d in trackers:
+            if tracker.done:
+                d.callback(None)
+            else:
+                d.errback(ConnectionDone("Connection was shut down before "
+                                         "ZeroMQ released message buffers"))
+
+        queue, self.queue = self.queue, deque()
+        self.queueBytes = 0
+        for _, _, _, _, d in queue:
+            if d is not None:
+                d.errback(ConnectionDone("Connection was shut down before "
+                                         "message was sent"))
+
+        if self.producer_call is not None:
+            self.producer_call.cancel()
+            self.producer_call = None
+
+        if self.producer is not None:
+            producer, self.producer = self.producer, None
+            producer.stopProducing()
 
     def __repr__(self):
         return "%s(%r, %r)" % (
@@ -243,9 +372,19 @@ class ZmqConnection(object):
         """
         Read multipart in non-blocking manner, returns with ready message
         or raising exception (in case of no more messages available).
+
+        If :attr:`recvCopy` is False, frames of at least
+        :attr:`recvCopyThreshold` bytes are returned as :class:`zmq.Frame`
+        objects, smaller frames are returned as `bytes`.
         """
         while True:
-            self.recv_parts.append(self.socket.recv(constants.NOBLOCK))
+            if self.recvCopy:
+                self.recv_parts.append(self.socket.recv(constants.NOBLOCK))
+            else:
+                frame = self.socket.recv(constants.NOBLOCK, copy=False)
+                if len(frame) < self.recvCopyThreshold:
+                    frame = frame.bytes
+                self.recv_parts.append(frame)
             if not self.socket.get(constants.RCVMORE):
                 result, self.recv_parts = self.recv_parts, []
 
@@ -260,21 +399,69 @@ class ZmqConnection(object):
 
         Implementation of :tm:`IReadDescriptor
         <internet.interfaces.IReadDescriptor>`.
+
+        If :attr:`maxMessagesPerRead` is set, at most that many messages
+        are processed in one call, remaining messages are processed
+        on the next reactor iteration.
         """
-        if self.read_scheduled is not None:
-            if not self.read_scheduled.called:
-                self.read_scheduled.cancel()
-            self.read_scheduled = None
+        if self.factory is None:  # disconnected
+            return
 
+        self.factory.pendingReads.discard(self)
+
+        if self.queue:
+            events = self.socket.get(constants.EVENTS)
+            if (events & constants.POLLOUT) == constants.POLLOUT:
+                self._flushQueue()
+
+        if self.producer is not None and self.producerPaused and \
+                not self.queue:
+            self.producerPaused = False
+            self.producer.resumeProducing()
+
+        if self.messageBatchSize:
+            batch = []
+            for message in self._readMessages():
+                batch.append(message)
+                if len(batch) >= self.messageBatchSize:
+                    log.callWithLogger(self, self.messagesReceived, batch)
+                    batch = []
+            if batch and self.factory is not None:
+                log.callWithLogger(self, self.messagesReceived, batch)
+        else:
+            for message in self._readMessages():
+                log.callWithLogger(self, self.messageReceived, message)
+
+    def _readMessages(self):
+        """
+        Read incoming messages while they're available.
+
+        Reading stops when connection is shut down or when
+        :attr:`maxMessagesPerRead` limit is hit, in the latter case
+        read is rescheduled.
+        """
+        count = 0
         while True:
             if self.factory is None:  # disconnected
                 return
 
+            if self.readingPaused:
+                return
+
             events = self.socket.get(constants.EVENTS)
 
             if (events & constants.POLLIN) != constants.POLLIN:
                 return
 
+            if self.maxMessagesPerRead and count >= self.maxMessagesPerRead:
+                # yield to the reactor, ZeroMQ won't signal messages
+                # which are already pending, so read is rescheduled
+                self.readBudgetHits += 1
+                self.factory.scheduleRead(self)
+                return
+
+            count += 1
+
             try:
                 message = self._readMultipart()
             except error.ZMQError as e:
@@ -283,7 +470,7 @@ class ZmqConnection(object):
 
                 raise e
 
-            log.callWithLogger(self, self.messageReceived, message)
+            yield message
 
     def logPrefix(self):
         """
@@ -295,30 +482,412 @@ class ZmqConnection(object):
         """
         return 'ZMQ'
 
-    def send(self, message):
+    def send(self, message, copy=True, track=False):
         """
         Send message via ZeroMQ socket.
 
-        Sending is performed directly to ZeroMQ without queueing. If HWM is
-        reached on ZeroMQ side, sending operation is aborted with exception
-        from ZeroMQ (EAGAIN).
+        By default sending is performed directly to ZeroMQ without queueing.
+        If HWM is reached on ZeroMQ side, sending operation is aborted with
+        exception from ZeroMQ (EAGAIN). If :attr:`queueOutgoing` is set,
+        message is queued instead and sent as soon as ZeroMQ socket becomes
+        writable, see :attr:`queueOverflowPolicy` for queue overflow
+        handling.
 
         After writing read is scheduled as ZeroMQ may not signal incoming
         messages after we touched socket with write request.
 
+        Message parts could be any objects supporting buffer protocol
+        (`bytes`, `bytearray`, `memoryview`, NumPy arrays, ...). With
+        `copy` set to False, ZeroMQ references part buffers directly
+        instead of copying them, so buffers shouldn't be modified until
+        ZeroMQ releases them, use `track` to get notified about that.
+
         :param message: message data, could be either list of str (multipart
             message) or just str
         :type message: str or list of str
+        :param copy: should the message be sent in copying manner?
+        :type copy: bool
+        :param track: track sending of message, implies `copy` set to False
+        :type track: bool
+        :return: if `track` is True, Deferred that fires when ZeroMQ releases
+            buffers of all the message parts, None otherwise
+        """
+        if not is_multipart(message):
+            message = [message]
+
+        if track:
+            copy = False
+
+        d = defer.Deferred() if track else None
+        self._send(message, copy, track, d)
+
+        self.factory.scheduleRead(self)
+
+        return d
+
+    def sendMany(self, messages, copy=True):
+        """
+        Send many messages via ZeroMQ socket.
+
+        Equivalent to calling :meth:`send` for each message, but cheaper,
+        as read is scheduled once for the whole batch.
+
+        If HWM is reached in the middle of the batch and
+        :attr:`queueOutgoing` is set, the rest of the batch is queued,
+        otherwise exception from ZeroMQ is raised (messages preceding
+        failed one are sent).
+
+        :param messages: list of messages, each message could be either
+            list of str (multipart message) or just str
+        :type messages: list
+        :param copy: should the messages be sent in copying manner?
+        :type copy: bool
+        """
+        send = self._send
+        try:
+            for message in messages:
+                if not is_multipart(message):
+                    message = [message]
+                send(message, copy, False, None)
+        finally:
+            self.factory.scheduleRead(self)
+
+    def sendEnvelope(self, envelope, parts, copy=True):
+        """
+        Send message consisting of envelope (routing) frames followed
+        by body frames.
+
+        Equivalent to ``send(list(envelope) + list(parts))``, but frames
+        are written straight to ZeroMQ socket without building
+        intermediate list.
+
+        :param envelope: envelope frames (e.g. peer identity)
+        :type envelope: tuple or list
+        :param parts: body frames
+        :type parts: tuple or list
+        :param copy: should the message be sent in copying manner?
+        :type copy: bool
         """
-        if not is_nonstr_iter(message):
-            self.socket.send(message, constants.NOBLOCK)
+        try:
+            if self.queue:
+                # keep messages ordered
+                self._enqueue(list(envelope) + list(parts), copy, False, None)
+                return
+
+            try:
+                self._writeEnvelope(envelope, parts, copy)
+            except error.ZMQError as e:
+                if e.errno != constants.EAGAIN or not self.queueOutgoing:
+                    raise e
+
+                self._enqueue(list(envelope) + list(parts), copy, False, None)
+        finally:
+            self.factory.scheduleRead(self)
+
+    def _writeEnvelope(self, envelope, parts, copy):
+        """
+        Write envelope and body frames to ZeroMQ socket.
+        """
+        if not parts:
+            envelope, parts = envelope[:-1], envelope[-1:]
+
+        send = self.socket.send
+        more = constants.NOBLOCK | constants.SNDMORE
+        for frame in envelope:
+            send(frame, more, copy=copy)
+
+        last = len(parts) - 1
+        for i in range(last):
+            send(parts[i], more, copy=copy)
+        send(parts[last], constants.NOBLOCK, copy=copy)
+
+    def sendDeferred(self, message, copy=True):
+        """
+        Send message via ZeroMQ socket, returning Deferred.
+
+        Unlike :meth:`send`, this method never raises: returned Deferred
+        fires when message is passed to ZeroMQ (immediately or after
+        waiting in outgoing queue, if :attr:`queueOutgoing` is set)
+        or errbacks if message can't be sent: HWM is reached and
+        queueing is disabled, message was dropped because of queue
+        overflow (:class:`ZmqQueueOverflowError`) or connection was shut
+        down while message was waiting in the queue.
+
+        :param message: message data, see :meth:`send`
+        :param copy: should the message be sent in copying manner?
+        :type copy: bool
+        :return: Deferred that fires when message is passed to ZeroMQ
+        """
+        if not is_multipart(message):
+            message = [message]
+
+        d = defer.Deferred()
+        try:
+            self._send(message, copy, False, d)
+        except error.ZMQError:
+            return defer.fail()
+
+        self.factory.scheduleRead(self)
+
+        return d
+
+    def _send(self, parts, copy, track, d):
+        """
+        Send message parts or queue them if ZeroMQ socket isn't writable
+        and queueing is enabled.
+
+        :param parts: message parts
+        :type parts: list
+        :param d: Deferred to fire when message is sent (or ZeroMQ
+            releases message buffers, if `track` is set), could be None
+        """
+        if self.queue:
+            # keep messages ordered
+            self._enqueue(parts, copy, track, d)
+            return
+
+        try:
+            trackers = self._write(parts, copy, track)
+        except error.ZMQError as e:
+            if e.errno != constants.EAGAIN or not self.queueOutgoing:
+                raise e
+
+            self._enqueue(parts, copy, track, d)
         else:
-            for m in message[:-1]:
-                self.socket.send(m, constants.NOBLOCK | constants.SNDMORE)
-            self.socket.send(message[-1], constants.NOBLOCK)
+            self._sent(trackers, track, d)
 
-        if self.read_scheduled is None:
-            self.read_scheduled = reactor.callLater(0, self.doRead)
+    def _write(self, parts, copy, track):
+        """
+        Write message parts to ZeroMQ socket.
+
+        :return: list of ZeroMQ trackers for message parts
+        """
+        trackers = []
+        for m in parts[:-1]:
+            trackers.append(self.socket.send(
+                m, constants.NOBLOCK | constants.SNDMORE, copy=copy,
+                track=track))
+        trackers.append(self.socket.send(
+            parts[-1], constants.NOBLOCK, copy=copy, track=track))
+        return trackers
+
+    def _sent(self, trackers, track, d):
+        """
+        Message was passed to ZeroMQ, fire Deferred or start tracking
+        message buffers.
+        """
+        if track:
+            self._trackSend(MessageTracker(*trackers), d)
+        elif d is not None:
+            d.callback(None)
+
+    def _queueFull(self, size):
+        """
+        Check whether message of `size` bytes doesn't fit into
+        outgoing queue.
+        """
+        if self.queueMaxMessages and len(self.queue) >= self.queueMaxMessages:
+            return True
+        if self.queueMaxBytes and self.queueBytes + size > self.queueMaxBytes:
+            return True
+        return False
+
+    def _enqueue(self, parts, copy, track, d):
+        """
+        Put message to outgoing queue, applying overflow policy
+        if queue is full.
+        """
+        size = sum(buffer_size(m) for m in parts)
+
+        if self._queueFull(size):
+            if self.queueOverflowPolicy == ZmqQueueOverflowPolicy.dropNewest:
+                self.queueDropped += 1
+                if d is not None:
+                    d.errback(ZmqQueueOverflowError())
+                return
+            elif (self.queueOverflowPolicy ==
+                  ZmqQueueOverflowPolicy.dropOldest):
+                while self.queue and self._queueFull(size):
+                    _, dropped_size, _, _, dropped_d = self.queue.popleft()
+                    self.queueBytes -= dropped_size
+                    self.queueDropped += 1
+                    if dropped_d is not None:
+                        dropped_d.errback(ZmqQueueOverflowError())
+            else:
+                raise ZmqQueueOverflowError()
+
+        self.queue.append((parts, size, copy, track, d))
+        self.queueBytes += size
+
+        if self.readingPaused:
+            # we need POLLOUT notifications to flush the queue
+            self.factory.reactor.addReader(self)
+
+    def _flushQueue(self):
+        """
+        Send messages from outgoing queue while ZeroMQ socket is writable.
+        """
+        while self.queue:
+            parts, size, copy, track, d = self.queue[0]
+            try:
+                trackers = self._write(parts, copy, track)
+            except error.ZMQError as e:
+                if e.errno == constants.EAGAIN:
+                    return
+
+                raise e
+
+            self.queue.popleft()
+            self.queueBytes -= size
+            self._sent(trackers, track, d)
+
+            if self.factory is None:  # shut down by callback
+                return
+
+        if self.readingPaused and self.factory is not None:
+            self.factory.reactor.removeReader(self)
+
+    def registerProducer(self, producer, streaming):
+        """
+        Register to receive data from a producer.
+
+        Implementation of :tm:`IConsumer <internet.interfaces.IConsumer>`.
+
+        Streaming producer is paused when message written via :meth:`write`
+        can't be passed to ZeroMQ right away and ends up in outgoing queue
+        (HWM is reached), it is resumed when outgoing queue is flushed.
+        Non-streaming producer is asked for more data after each
+        :meth:`write`: on the next reactor iteration if message was passed
+        to ZeroMQ, or when outgoing queue is flushed. Flow control requires
+        :attr:`queueOutgoing` to be set.
+
+        :param producer: producer to register
+        :param streaming: is `producer` streaming (push) producer?
+        :type streaming: bool
+        """
+        if self.producer is not None:
+            raise RuntimeError(
+                "Cannot register producer %s, because producer %s was never "
+                "unregistered." % (producer, self.producer))
+
+        self.producer = producer
+        self.streamingProducer = streaming
+        self.producerPaused = False
+        if not streaming:
+            producer.resumeProducing()
+
+    def unregisterProducer(self):
+        """
+        Stop consuming data from a producer.
+
+        Implementation of :tm:`IConsumer <internet.interfaces.IConsumer>`.
+        """
+        if self.producer_call is not None:
+            self.producer_call.cancel()
+            self.producer_call = None
+        self.producer = None
+
+    def write(self, data):
+        """
+        Send message coming from producer.
+
+        Implementation of :tm:`IConsumer <internet.interfaces.IConsumer>`.
+
+        :param data: message data, see :meth:`send`
+        """
+        self.send(data)
+
+        if self.producer is None or self.producerPaused:
+            return
+
+        if self.queue:
+            # resumed when queue is flushed
+            self.producerPaused = True
+            if self.streamingProducer:
+                self.producer.pauseProducing()
+        elif not self.streamingProducer and self.producer_call is None:
+            self.producer_call = self.factory.reactor.callLater(
+                0, self._resumeProducer)
+
+    def _resumeProducer(self):
+        """
+        Ask non-streaming producer for more data.
+        """
+        self.producer_call = None
+        if self.producer is not None and not self.producerPaused:
+            self.producer.resumeProducing()
+
+    def pauseProducing(self):
+        """
+        Pause reading of incoming messages.
+
+        Implementation of :tm:`IPushProducer
+        <internet.interfaces.IPushProducer>`.
+
+        Connection is removed from the reactor, incoming messages stay
+        queued inside ZeroMQ (up to HWM).
+        """
+        self.readingPaused = True
+        if not self.queue:
+            self.factory.reactor.removeReader(self)
+
+    def resumeProducing(self):
+        """
+        Resume reading of incoming messages.
+
+        Implementation of :tm:`IPushProducer
+        <internet.interfaces.IPushProducer>`.
+        """
+        if not self.readingPaused:
+            return
+
+        self.readingPaused = False
+        self.factory.reactor.addReader(self)
+        self.factory.scheduleRead(self)
+
+    def stopProducing(self):
+        """
+        Stop producing data, shut down connection.
+
+        Implementation of :tm:`IPushProducer
+        <internet.interfaces.IPushProducer>`.
+        """
+        if self.factory is not None:
+            self.shutdown()
+
+    def _trackSend(self, tracker, d):
+        """
+        Start tracking sent message.
+
+        :param tracker: ZeroMQ tracker for message parts
+        :type tracker: zmq.MessageTracker
+        :param d: Deferred to fire when `tracker` is done
+        """
+        if tracker.done:
+            d.callback(None)
+            return
+
+        self.trackers.append((tracker, d))
+        if self.tracker_poll is None:
+            self.tracker_poll = self.factory.reactor.callLater(
+                self.trackerPollInterval, self._pollTrackers)
+
+    def _pollTrackers(self):
+        """
+        Fire Deferreds for messages which buffers were released by ZeroMQ.
+        """
+        self.tracker_poll = None
+
+        trackers, self.trackers = self.trackers, []
+        for tracker, d in trackers:
+            if tracker.done:
+                d.callback(None)
+            else:
+                self.trackers.append((tracker, d))
+
+        if self.trackers and self.factory is not None:
+            self.tracker_poll = self.factory.reactor.callLater(
+                self.trackerPollInterval, self._pollTrackers)
 
     def messageReceived(self, message):
         """
@@ -331,6 +900,21 @@ class ZmqConnection(object):
         """
         raise NotImplementedError(self)
 
+    def messagesReceived(self, messages):
+        """
+        Called with a batch of complete messages, when
+        :attr:`messageBatchSize` is set.
+
+        Default implementation calls :meth:`messageReceived` for
+        each message, could be overridden to process the whole batch
+        at once.
+
+        :param messages: list of messages
+        :type messages: list
+        """
+        for message in messages:
+            self.messageReceived(message)
+
     def _connectOrBind(self, endpoints):
         """
         Connect and/or bind socket to endpoints.
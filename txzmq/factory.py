@@ -4,6 +4,9 @@ ZeroMQ Twisted factory which is controlling ZeroMQ context.
 from zmq import Context
 
 from twisted.internet import reactor
+from twisted.python import log
+
+from txzmq.proxy import ZmqProxy
 
 
 class ZmqFactory(object):
@@ -21,6 +24,9 @@ class ZmqFactory(object):
 
     :var connections: set of instanciated :class:`ZmqConnection`
     :vartype connections: set
+    :var pendingReads: set of connections waiting for scheduled read,
+        see :meth:`scheduleRead`
+    :vartype pendingReads: set
     :var context: ZeroMQ context
     """
 
@@ -36,6 +42,8 @@ class ZmqFactory(object):
         Create ZeroMQ context.
         """
         self.connections = set()
+        self.pendingReads = set()
+        self.read_scheduled = None
         self.context = Context(self.ioThreads)
 
     def __repr__(self):
@@ -54,6 +62,10 @@ class ZmqFactory(object):
 
         self.connections = None
 
+        if self.read_scheduled is not None:
+            self.read_scheduled.cancel()
+            self.read_scheduled = None
+
         self.context.term()
         self.context = None
         if self.trigger:
@@ -73,3 +85,45 @@ class ZmqFactory(object):
         self.trigger = self.reactor.addSystemEventTrigger(
             'during', 'shutdown', self.shutdown
         )
+
+    def proxy(self, frontendType, frontendEndpoints, backendType,
+              backendEndpoints, captureEndpoint=None):
+        """
+        Start ZeroMQ proxy forwarding messages between frontend and backend
+        sockets in separate thread.
+
+        See :class:`ZmqProxy` for description of parameters.
+
+        :return: proxy handle
+        :rtype: :class:`ZmqProxy`
+        """
+        return ZmqProxy(self, frontendType, frontendEndpoints, backendType,
+                        backendEndpoints, captureEndpoint)
+
+    def scheduleRead(self, connection):
+        """
+        Schedule read on `connection` on the next reactor iteration.
+
+        Reads scheduled for all the connections during one reactor
+        iteration are coalesced: single reactor call processes them all.
+
+        :param connection: connection to read from
+        :type connection: :class:`ZmqConnection`
+        """
+        self.pendingReads.add(connection)
+
+        if self.read_scheduled is None:
+            self.read_scheduled = self.reactor.callLater(0, self._doReads)
+
+    def _doReads(self):
+        """
+        Process reads scheduled with :meth:`scheduleRead`.
+        """
+        self.read_scheduled = None
+
+        connections, self.pendingReads = self.pendingReads, set()
+        for connection in connections:
+            try:
+                connection.doRead()
+            except Exception:
+                log.err(None, "Error while reading from %r" % (connection,))
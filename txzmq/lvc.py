@@ -0,0 +1,129 @@
+"""
+Last value cache proxy: late subscribers get the latest message
+for each tag right away.
+"""
+from collections import OrderedDict
+
+from txzmq.pubsub import ZmqXPubConnection, ZmqXSubConnection
+
+
+class _ZmqLVCFrontend(ZmqXSubConnection):
+    """
+    Cache socket facing publishers.
+    """
+
+    def __init__(self, cache, *args, **kwargs):
+        self.cache = cache
+        ZmqXSubConnection.__init__(self, *args, **kwargs)
+
+    def messageReceived(self, message):
+        _, tag = self._unframe(message)
+        self.cache._gotMessage(tag, message)
+
+
+class _ZmqLVCBackend(ZmqXPubConnection):
+    """
+    Cache socket facing subscribers.
+    """
+    verbose = True
+
+    def __init__(self, cache, *args, **kwargs):
+        self.cache = cache
+        ZmqXPubConnection.__init__(self, *args, **kwargs)
+
+    def gotSubscription(self, tag):
+        self.cache._replay(tag)
+
+
+class ZmqLastValueCache(object):
+    """
+    Last value cache (LVC) proxy between publishers and subscribers.
+
+    Proxy subscribes to all the messages of publishers connected to
+    frontend XSUB socket and forwards them to subscribers via backend
+    XPUB socket, keeping the latest message for each tag. When
+    subscription arrives, cached messages matching subscribed prefix are
+    sent right away, so subscriber doesn't wait for the next update.
+
+    Cache is LRU bounded by number of entries and total size of messages.
+
+    As XPUB can't address single subscriber, replayed messages are
+    received by all the subscribers of matching tags.
+
+    :var maxEntries: maximum number of cached tags, 0 means no limit
+    :vartype maxEntries: int
+    :var maxBytes: maximum total size of cached messages, 0 means no limit
+    :vartype maxBytes: int
+    :var frontend: connection facing publishers
+    :var backend: connection facing subscribers
+    :var cache: tag -> (message parts, size of message), least recently
+        updated first
+    :vartype cache: :class:`collections.OrderedDict`
+    :var cacheBytes: total size of cached messages
+    :vartype cacheBytes: int
+    :var evictedCount: number of entries evicted because of limits
+    :vartype evictedCount: int
+    :var replayedCount: number of cached messages sent on subscriptions
+    :vartype replayedCount: int
+    """
+    maxEntries = 10000
+    maxBytes = 0
+
+    def __init__(self, factory, frontendEndpoint=None, backendEndpoint=None):
+        """
+        Constructor.
+
+        :param factory: ZeroMQ Twisted factory
+        :type factory: :class:`ZmqFactory`
+        :param frontendEndpoint: endpoint for publishers
+        :type frontendEndpoint: :class:`ZmqEndpoint`
+        :param backendEndpoint: endpoint for subscribers
+        :type backendEndpoint: :class:`ZmqEndpoint`
+        """
+        self.factory = factory
+        self.cache = OrderedDict()
+        self.cacheBytes = 0
+        self.evictedCount = 0
+        self.replayedCount = 0
+
+        self.frontend = _ZmqLVCFrontend(self, factory, frontendEndpoint)
+        self.backend = _ZmqLVCBackend(self, factory, backendEndpoint)
+        self.frontend.subscribe(b'')
+
+    def shutdown(self):
+        """
+        Shutdown proxy connections.
+        """
+        self.frontend.shutdown()
+        self.backend.shutdown()
+
+    def _gotMessage(self, tag, message):
+        """
+        Message from publisher: update cache, forward to subscribers.
+        """
+        cache = self.cache
+        size = sum(len(part) for part in message)
+
+        old = cache.pop(tag, None)
+        if old is not None:
+            self.cacheBytes -= old[1]
+        cache[tag] = (message, size)
+        self.cacheBytes += size
+
+        while cache and (
+                (self.maxEntries and len(cache) > self.maxEntries) or
+                (self.maxBytes and self.cacheBytes > self.maxBytes)):
+            _, (_, evictedSize) = cache.popitem(last=False)
+            self.cacheBytes -= evictedSize
+            self.evictedCount += 1
+
+        self.backend.send(message)
+
+    def _replay(self, prefix):
+        """
+        Subscription arrived: send cached messages matching prefix.
+        """
+        messages = [message for tag, (message, _) in self.cache.items()
+                    if tag.startswith(prefix)]
+        self.replayedCount += len(messages)
+        self.backend.sendMany(messages)
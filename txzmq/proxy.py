@@ -0,0 +1,301 @@
+"""
+ZeroMQ proxy (device) running in separate thread.
+"""
+import itertools
+import struct
+import threading
+from collections import deque
+
+import zmq
+from zmq import constants, Socket
+
+from twisted.internet import defer
+
+from txzmq.connection import ZmqConnection, ZmqEndpoint, ZmqEndpointType
+
+
+_proxyCounter = itertools.count()
+
+_statisticsStruct = struct.Struct('=Q')
+
+# names of counters in STATISTICS reply (in order)
+_statisticsFields = (
+    'frontendMessagesIn', 'frontendBytesIn',
+    'frontendMessagesOut', 'frontendBytesOut',
+    'backendMessagesIn', 'backendBytesIn',
+    'backendMessagesOut', 'backendBytesOut',
+)
+
+
+class _ZmqProxyControl(ZmqConnection):
+    """
+    Reactor side of proxy control socket.
+    """
+    socketType = constants.PAIR
+
+    def __init__(self, proxy, *args, **kwargs):
+        self.proxy = proxy
+        self.statistics = deque()
+        ZmqConnection.__init__(self, *args, **kwargs)
+
+    def messageReceived(self, message):
+        # libzmq >= 4.3.5 acknowledges other commands with empty message
+        if len(message) == len(_statisticsFields) and self.statistics:
+            self.statistics.popleft().callback(dict(zip(
+                _statisticsFields,
+                [_statisticsStruct.unpack(part)[0] for part in message])))
+
+    def shutdown(self):
+        self.proxy._shutdown()
+        ZmqConnection.shutdown(self)
+        while self.statistics:
+            self.statistics.popleft().errback(defer.CancelledError())
+
+
+class ZmqProxy(object):
+    """
+    ZeroMQ proxy running in separate thread.
+
+    Messages are forwarded between frontend and backend sockets by
+    libzmq (``zmq_proxy_steerable``) without passing through Python code
+    or reactor, so GIL isn't held while forwarding. Proxy is controlled
+    from the reactor thread via inproc control socket.
+
+    Sockets are created and bound/connected in the reactor thread, so
+    errors are reported right away, then handed over to proxy thread.
+
+    Create via :meth:`ZmqFactory.proxy`, proxy is terminated on
+    factory shutdown. On reactor shutdown proxy is terminated before
+    factories are shut down, reactor waits for proxy thread to exit.
+
+    :var paused: is forwarding paused?
+    :vartype paused: bool
+    :var started: Deferred firing when proxy thread starts
+    :var stopped: Deferred firing when proxy terminates (with failure if
+        proxy stopped because of an error)
+    """
+
+    def __init__(self, factory, frontendType, frontendEndpoints, backendType,
+                 backendEndpoints, captureEndpoint=None):
+        """
+        Constructor.
+
+        :param factory: ZeroMQ Twisted factory
+        :type factory: :class:`ZmqFactory`
+        :param frontendType: frontend socket type (e.g. ROUTER, XSUB, PULL)
+        :param frontendEndpoints: list of frontend endpoints
+        :type frontendEndpoints: list of :class:`ZmqEndpoint`
+        :param backendType: backend socket type (e.g. DEALER, XPUB, PUSH)
+        :param backendEndpoints: list of backend endpoints
+        :type backendEndpoints: list of :class:`ZmqEndpoint`
+        :param captureEndpoint: if set, all the forwarded messages are
+            published on PUB socket bound/connected to that endpoint
+        :type captureEndpoint: :class:`ZmqEndpoint`
+        """
+        self.factory = factory
+        self.started = defer.Deferred()
+        self.stopped = defer.Deferred()
+        self.sockets = []
+        self.thread = None
+        self.terminated = False
+        self.paused = False
+        self.totals = dict.fromkeys(_statisticsFields, 0)
+
+        controlAddress = "inproc://txzmq-proxy-%d" % (next(_proxyCounter),)
+
+        try:
+            self.frontend = self._socket(frontendType, frontendEndpoints)
+            self.backend = self._socket(backendType, backendEndpoints)
+            self.capture = None
+            if captureEndpoint is not None:
+                self.capture = self._socket(constants.PUB, [captureEndpoint])
+            self.control = _ZmqProxyControl(
+                self, factory,
+                ZmqEndpoint(ZmqEndpointType.bind, controlAddress))
+            self.proxyControl = self._socket(
+                constants.PAIR,
+                [ZmqEndpoint(ZmqEndpointType.connect, controlAddress)])
+        except Exception:
+            for socket in self.sockets:
+                socket.close()
+            raise
+
+        self.thread = threading.Thread(
+            target=self._run, name="txzmq-proxy %s" % (controlAddress,))
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.trigger = factory.reactor.addSystemEventTrigger(
+            'before', 'shutdown', self.terminate)
+
+    def _socket(self, socketType, endpoints):
+        """
+        Create socket and connect/bind it to endpoints.
+        """
+        socket = Socket(self.factory.context, socketType)
+        self.sockets.append(socket)
+        socket.set(constants.LINGER, self.factory.lingerPeriod)
+
+        for endpoint in endpoints:
+            if endpoint.type == ZmqEndpointType.connect:
+                socket.connect(endpoint.address)
+            elif endpoint.type == ZmqEndpointType.bind:
+                socket.bind(endpoint.address)
+            else:
+                assert False, "Unknown endpoint type %r" % endpoint
+
+        return socket
+
+    def _run(self):
+        """
+        Proxy thread.
+
+        Pausing is implemented by terminating native proxy (sockets are
+        kept) and waiting for commands on control socket until resumed:
+        native PAUSE/RESUME don't work reliably in some libzmq versions.
+        """
+        reactor = self.factory.reactor
+        reactor.callFromThread(self.started.callback, self)
+
+        try:
+            while True:
+                zmq.proxy_steerable(self.frontend, self.backend,
+                                    self.capture, self.proxyControl)
+                if self.terminated or not self._paused():
+                    break
+        except zmq.ContextTerminated:
+            pass
+        except Exception as e:
+            self._closeSockets()
+            reactor.callFromThread(self.stopped.errback, e)
+            return
+
+        self._closeSockets()
+        reactor.callFromThread(self.stopped.callback, self)
+
+    def _paused(self):
+        """
+        Serve control commands while proxy is paused (in proxy thread).
+
+        :return: True if proxy should be resumed, False if terminated
+        """
+        while True:
+            command = self.proxyControl.recv()
+            if command == b'RESUME':
+                self.proxyControl.send(b'')
+                return True
+            elif command == b'STATISTICS':
+                zero = _statisticsStruct.pack(0)
+                self.proxyControl.send_multipart(
+                    [zero] * len(_statisticsFields))
+            elif command == b'TERMINATE':
+                return False
+            else:
+                self.proxyControl.send(b'')
+
+    def _closeSockets(self):
+        for socket in self.sockets:
+            socket.close()
+
+    def _command(self, command):
+        if self.terminated:
+            raise zmq.ZMQError(zmq.ENOTSOCK)
+        self.control.send(command)
+
+    def _accumulate(self, counters):
+        """
+        Add counters of finished proxy run to totals.
+        """
+        for field in _statisticsFields:
+            self.totals[field] += counters[field]
+
+    def _addTotals(self, counters):
+        for field in _statisticsFields:
+            counters[field] += self.totals[field]
+        return counters
+
+    def pause(self):
+        """
+        Pause forwarding, messages are left in socket queues.
+
+        Counters of messages forwarded right while pausing might be lost
+        from :meth:`statistics`.
+
+        :return: Deferred firing when proxy is about to pause
+        """
+        if self.paused:
+            return defer.succeed(None)
+        self.paused = True
+
+        # collect counters of current proxy run before terminating it
+        self._command(b'STATISTICS')
+        d = defer.Deferred()
+        d.addCallback(self._accumulate)
+        self.control.statistics.append(d)
+        self._command(b'TERMINATE')
+        return d
+
+    def resume(self):
+        """
+        Resume forwarding after :meth:`pause`.
+        """
+        if not self.paused:
+            return
+        self.paused = False
+
+        self._command(b'RESUME')
+
+    def statistics(self):
+        """
+        Collect proxy statistics.
+
+        :return: Deferred firing with dict of counters: number of messages
+            and bytes received and sent on frontend and backend sockets,
+            e.g. ``frontendMessagesIn``, ``backendBytesOut``
+        """
+        self._command(b'STATISTICS')
+        d = defer.Deferred()
+        d.addCallback(self._addTotals)
+        self.control.statistics.append(d)
+        return d
+
+    def terminate(self):
+        """
+        Terminate proxy, close its sockets.
+
+        :return: :attr:`stopped` Deferred
+        """
+        if not self.terminated:
+            self._shutdown()
+            # TERMINATE could be lost if control socket is closed right
+            # after sending it, so keep it open until proxy thread stops
+            self.stopped.addBoth(self._closeControl)
+        return self.stopped
+
+    def _closeControl(self, result):
+        if self.control.factory is not None:
+            self.control.shutdown()
+        return result
+
+    def _shutdown(self):
+        """
+        Terminate proxy on :meth:`terminate` or factory shutdown.
+
+        Proxy thread isn't waited for, it closes its sockets right after
+        receiving TERMINATE (or when ZeroMQ context is terminated on factory
+        shutdown), so terminating ZeroMQ context doesn't block for long.
+        """
+        if self.terminated:
+            return
+        self.terminated = True
+
+        try:
+            self.factory.reactor.removeSystemEventTrigger(self.trigger)
+        except Exception:
+            pass  # just ignore while triggered by the reactor
+
+        try:
+            self.control.send(b'TERMINATE')
+        except zmq.ZMQError:
+            # proxy thread has already stopped
+            pass
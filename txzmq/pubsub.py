@@ -3,16 +3,28 @@ ZeroMQ PUB-SUB wrappers.
 """
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+
 from zmq import constants
 
+from txzmq.compat import to_bytes
 from txzmq.connection import ZmqConnection
+from txzmq.topictrie import TopicTrie
 
 
 class ZmqPubConnection(ZmqConnection):
     """
     Publishing in broadcast manner.
+
+    :var multipartTopic: if set, tag is sent as separate message part
+        and message data is sent without copying, instead of concatenating
+        tag, :attr:`topicSep` and message data (:class:`ZmqSubConnection`
+        handles both framings); message buffers shouldn't be modified
+        after publishing
+    :vartype multipartTopic: bool
     """
     socketType = constants.PUB
+    multipartTopic = False
 
     def publish(self, message, tag=b''):
         """
@@ -27,7 +39,34 @@ class ZmqPubConnection(ZmqConnection):
             tag = tag.encode()
         if isinstance(message, str):
             message = message.encode()
-        self.send(tag + self.topicSep + message)
+
+        if self.multipartTopic:
+            self.sendEnvelope((tag,), (message,), copy=False)
+        else:
+            self.send(tag + self.topicSep + message)
+
+    def publishMany(self, messages):
+        """
+        Publish many messages at once.
+
+        See :meth:`ZmqConnection.sendMany`.
+
+        :param messages: list of tuples (message, tag)
+        :type messages: list
+        """
+        topicSep = self.topicSep
+        multipartTopic = self.multipartTopic
+        framed = []
+        for message, tag in messages:
+            if isinstance(tag, str):
+                tag = tag.encode()
+            if isinstance(message, str):
+                message = message.encode()
+            if multipartTopic:
+                framed.append([tag, message])
+            else:
+                framed.append(tag + topicSep + message)
+        self.sendMany(framed, copy=not multipartTopic)
 
 
 class ZmqSubConnection(ZmqConnection):
@@ -35,30 +74,73 @@ class ZmqSubConnection(ZmqConnection):
     Subscribing to messages published by publishers.
 
     Subclass this class and implement :meth:`gotMessage` to handle incoming
-    messages.
+    messages, or register handlers for tag prefixes with :meth:`subscribe`.
+
+    :var conflateTopics: if set, only the newest message for each tag
+        is kept and delivered every :attr:`conflateInterval` seconds, so
+        slow consumer never processes stale messages
+    :vartype conflateTopics: bool
+    :var conflateInterval: interval to deliver conflated messages, 0 means
+        deliver on the next reactor iteration after read
+    :vartype conflateInterval: float
+    :var conflatedCount: number of messages dropped because newer message
+        with the same tag arrived
+    :vartype conflatedCount: int
     """
     socketType = constants.SUB
+    conflateTopics = False
+    conflateInterval = 0
+
+    def __init__(self, *args, **kwargs):
+        self.handlers = TopicTrie()
+        self.conflated = OrderedDict()
+        self.conflatedCount = 0
+        self.conflate_call = None
+        ZmqConnection.__init__(self, *args, **kwargs)
+
+    def shutdown(self):
+        """
+        Shutdown connection, dropping conflated messages not yet delivered.
+        """
+        if self.conflate_call is not None:
+            self.conflate_call.cancel()
+            self.conflate_call = None
+        self.conflated.clear()
+
+        ZmqConnection.shutdown(self)
 
-    def subscribe(self, tag):
+    def subscribe(self, tag, handler=None):
         """
         Subscribe to messages with specified tag (prefix).
 
         Function may be called several times.
 
+        If `handler` is passed, messages with tags starting with `tag` are
+        passed to the handler instead of :meth:`gotMessage`. Handlers are
+        kept in prefix trie, so finding handlers for the message takes
+        O(len(tag)) regardless of number of subscriptions.
+
         :param tag: message tag
         :type tag: str
+        :param handler: callable accepting (message, tag)
         """
         self.socket.setsockopt(constants.SUBSCRIBE, tag)
+        if handler is not None:
+            self.handlers.add(tag, handler)
 
-    def unsubscribe(self, tag):
+    def unsubscribe(self, tag, handler=None):
         """
         Unsubscribe from messages with specified tag (prefix).
 
-        Function may be called several times.
+        Function may be called several times, each call cancels one
+        :meth:`subscribe` call with the same arguments.
 
         :param tag: message tag
         :type tag: str
+        :param handler: handler passed to :meth:`subscribe`
         """
+        if handler is not None:
+            self.handlers.remove(tag, handler)
         self.socket.setsockopt(constants.UNSUBSCRIBE, tag)
 
     def messageReceived(self, message):
@@ -66,16 +148,111 @@ class ZmqSubConnection(ZmqConnection):
         Overridden from :class:`ZmqConnection` to process
         and unframe incoming messages.
 
-        All parsed messages are passed to :meth:`gotMessage`.
+        Parsed messages are passed to handlers registered for the tag
+        or to :meth:`gotMessage`.
+
+        :param message: message data
+        """
+        payload, tag = self._unframe(message)
+
+        if self.conflateTopics:
+            self._conflate(payload, tag)
+        elif self.handlers:
+            self._dispatch(payload, tag)
+        else:
+            self.gotMessage(payload, tag)
+
+    def messagesReceived(self, messages):
+        """
+        Overridden from :class:`ZmqConnection` to process
+        and unframe batch of incoming messages.
+
+        Parsed messages are passed to :meth:`gotMessages`.
+
+        :param messages: list of messages
+        """
+        if self.conflateTopics:
+            for message in messages:
+                self._conflate(*self._unframe(message))
+            return
+
+        self.gotMessages([self._unframe(message) for message in messages])
+
+    def _conflate(self, message, tag):
+        """
+        Keep only the newest message for the tag until delivery.
+        """
+        conflated = self.conflated
+        if tag in conflated:
+            self.conflatedCount += 1
+        conflated[tag] = message
+
+        if self.conflate_call is None:
+            self.conflate_call = self.factory.reactor.callLater(
+                self.conflateInterval, self._deliverConflated)
+
+    def _deliverConflated(self):
+        """
+        Deliver conflated messages.
+        """
+        self.conflate_call = None
+        conflated, self.conflated = self.conflated, OrderedDict()
+
+        messages = [(message, tag) for tag, message in conflated.items()]
+        if self.messageBatchSize:
+            self.gotMessages(messages)
+        elif self.handlers:
+            for message, tag in messages:
+                self._dispatch(message, tag)
+        else:
+            for message, tag in messages:
+                self.gotMessage(message, tag)
+
+    def _unframe(self, message):
+        """
+        Split incoming message into message data and tag.
 
         :param message: message data
+        :return: tuple (message, tag)
         """
+        # with recvCopy disabled, large frames arrive as zmq.Frame
         if len(message) == 2:
             # compatibility receiving of tag as first part
             # of multi-part message
-            self.gotMessage(message[1], message[0])
+            return message[1], to_bytes(message[0])
+        else:
+            tag, payload = to_bytes(message[0]).split(self.topicSep, 1)
+            return payload, tag
+
+    def _dispatch(self, message, tag):
+        """
+        Pass message to handlers registered for the tag, if none,
+        to :meth:`gotMessage`.
+        """
+        handlers = self.handlers.match(tag)
+        if not handlers:
+            self.gotMessage(message, tag)
+            return
+
+        for handler in handlers:
+            handler(message, tag)
+
+    def gotMessages(self, messages):
+        """
+        Called on batch of incoming messages, when
+        :attr:`messageBatchSize` is set.
+
+        Default implementation passes each message to registered handlers
+        or :meth:`gotMessage`.
+
+        :param messages: list of tuples (message, tag)
+        """
+        if self.handlers:
+            for message, tag in messages:
+                self._dispatch(message, tag)
         else:
-            self.gotMessage(*reversed(message[0].split(self.topicSep, 1)))
+            for message, tag in messages:
+                self.gotMessage(message, tag)
 
     def gotMessage(self, message, tag):
         """
@@ -87,3 +264,90 @@ class ZmqSubConnection(ZmqConnection):
         :param tag: message tag
         """
         raise NotImplementedError(self)
+
+
+class ZmqXPubConnection(ZmqPubConnection):
+    """
+    Publishing connection exposing subscriptions of subscribers.
+
+    Wrapper around ZeroMQ XPUB socket: override :meth:`gotSubscription`
+    and :meth:`gotUnsubscription` to handle subscription events.
+
+    :var verbose: if set, all the subscriptions are passed to
+        :meth:`gotSubscription` (``ZMQ_XPUB_VERBOSE``), otherwise only
+        subscriptions to new tags
+    :vartype verbose: bool
+    """
+    socketType = constants.XPUB
+    verbose = False
+
+    def __init__(self, *args, **kwargs):
+        ZmqPubConnection.__init__(self, *args, **kwargs)
+        if self.verbose:
+            self.socket.set(constants.XPUB_VERBOSE, 1)
+
+    def messageReceived(self, message):
+        """
+        Overridden from :class:`ZmqConnection` to parse subscription events.
+
+        :param message: message data
+        """
+        event = message[0]
+        if event[:1] == b'\x01':
+            self.gotSubscription(event[1:])
+        elif event[:1] == b'\x00':
+            self.gotUnsubscription(event[1:])
+
+    def gotSubscription(self, tag):
+        """
+        Called when subscriber subscribes to tag (prefix).
+
+        :param tag: message tag
+        :type tag: str
+        """
+
+    def gotUnsubscription(self, tag):
+        """
+        Called when subscriber unsubscribes from tag (prefix).
+
+        :param tag: message tag
+        :type tag: str
+        """
+
+
+class ZmqXSubConnection(ZmqSubConnection):
+    """
+    Subscribing connection sending subscriptions as messages.
+
+    Wrapper around ZeroMQ XSUB socket, useful for forwarding
+    subscriptions received by :class:`ZmqXPubConnection` upstream.
+    """
+    socketType = constants.XSUB
+
+    def subscribe(self, tag, handler=None):
+        """
+        Subscribe to messages with specified tag (prefix).
+
+        See :meth:`ZmqSubConnection.subscribe`.
+
+        :param tag: message tag
+        :type tag: str
+        :param handler: callable accepting (message, tag)
+        """
+        self.send(b'\x01' + tag)
+        if handler is not None:
+            self.handlers.add(tag, handler)
+
+    def unsubscribe(self, tag, handler=None):
+        """
+        Unsubscribe from messages with specified tag (prefix).
+
+        See :meth:`ZmqSubConnection.unsubscribe`.
+
+        :param tag: message tag
+        :type tag: str
+        :param handler: handler passed to :meth:`subscribe`
+        """
+        if handler is not None:
+            self.handlers.remove(tag, handler)
+        self.send(b'\x00' + tag)
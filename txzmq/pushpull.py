@@ -14,14 +14,36 @@ class ZmqPushConnection(ZmqConnection):
     """
     socketType = constants.PUSH
 
-    def push(self, message):
+    def push(self, message, copy=True, track=False):
         """
         Push a message L{message}.
 
+        See :meth:`ZmqConnection.send` for description of `copy`
+        and `track`.
+
         :param message: message data
         :type message: str
+        :param copy: should the message be sent in copying manner?
+        :type copy: bool
+        :param track: track sending of message, implies `copy` set to False
+        :type track: bool
+        :return: if `track` is True, Deferred that fires when ZeroMQ releases
+            message buffers, None otherwise
+        """
+        return self.send(message, copy=copy, track=track)
+
+    def pushMany(self, messages, copy=True):
+        """
+        Push many messages at once.
+
+        See :meth:`ZmqConnection.sendMany`.
+
+        :param messages: list of messages
+        :type messages: list
+        :param copy: should the messages be sent in copying manner?
+        :type copy: bool
         """
-        self.send(message)
+        self.sendMany(messages, copy=copy)
 
 
 class ZmqPullConnection(ZmqConnection):
@@ -30,7 +52,8 @@ class ZmqPullConnection(ZmqConnection):
 
     Wrapper around ZeroMQ PULL socket.
 
-    Subclass and override :meth:`onPull`.
+    Subclass and override :meth:`onPull` (or :meth:`onPullBatch` if
+    :attr:`messageBatchSize` is set).
     """
     socketType = constants.PULL
 
@@ -42,6 +65,26 @@ class ZmqPullConnection(ZmqConnection):
         """
         self.onPull(message)
 
+    def messagesReceived(self, messages):
+        """
+        Called on batch of incoming messages from ZeroMQ, when
+        :attr:`messageBatchSize` is set.
+
+        :param messages: list of messages
+        """
+        self.onPullBatch(messages)
+
+    def onPullBatch(self, messages):
+        """
+        Called on batch of incoming messages received by puller.
+
+        Default implementation calls :meth:`onPull` for each message.
+
+        :param messages: list of messages
+        """
+        for message in messages:
+            self.onPull(message)
+
     def onPull(self, message):
         """
         Called on incoming message received by puller.
@@ -0,0 +1,428 @@
+"""
+Reliable PUB-SUB: sequence numbers, gap detection and snapshot recovery.
+"""
+import itertools
+import random
+import struct
+
+from txzmq.compat import to_bytes
+from txzmq.pubsub import ZmqPubConnection, ZmqSubConnection
+from txzmq.router_dealer import ZmqRouterConnection, ZmqDealerConnection
+
+
+# (publisher epoch, sequence number), sent as second message part
+_headerStruct = struct.Struct('!QQ')
+
+_snapshotIdStruct = struct.Struct('!Q')
+
+_SNAPSHOT_REQUEST = b'\x01'
+
+
+class _ZmqSnapshotServer(ZmqRouterConnection):
+    """
+    Publisher socket serving snapshot requests.
+    """
+
+    def __init__(self, publisher, *args, **kwargs):
+        self.publisher = publisher
+        ZmqRouterConnection.__init__(self, *args, **kwargs)
+
+    def messageReceived(self, message):
+        # [subscriber ID, command, snapshot ID, prefix]
+        if len(message) != 4 or message[1] != _SNAPSHOT_REQUEST:
+            return
+        self.sendEnvelope(message[0:1] + message[2:3],
+                          self.publisher._snapshot(message[3]))
+
+    def shutdown(self):
+        if self.publisher.snapshotServer is not self:
+            # already shut down along with publisher
+            return
+        self.publisher.snapshotServer = None
+        ZmqRouterConnection.shutdown(self)
+
+
+class _ZmqSnapshotClient(ZmqDealerConnection):
+    """
+    Subscriber socket requesting snapshots.
+    """
+
+    def __init__(self, subscriber, *args, **kwargs):
+        self.subscriber = subscriber
+        ZmqDealerConnection.__init__(self, *args, **kwargs)
+
+    def messageReceived(self, message):
+        self.subscriber._gotSnapshot(message)
+
+    def shutdown(self):
+        if self.subscriber.snapshotClient is not self:
+            # already shut down along with subscriber
+            return
+        self.subscriber.snapshotClient = None
+        ZmqDealerConnection.shutdown(self)
+
+
+class ZmqReliablePubConnection(ZmqPubConnection):
+    """
+    Publisher numbering messages of each tag.
+
+    Each message is sent as three parts: tag, header (publisher epoch
+    and per-tag sequence number) and message data, which is understood
+    by :class:`ZmqReliableSubConnection`. Epoch is chosen randomly on
+    start, so subscribers notice publisher restart.
+
+    If `snapshotEndpoint` is passed, the latest message for each tag is
+    kept and served over ROUTER socket to subscribers recovering from
+    lost messages (Clone pattern): state of the tag is its latest message,
+    intermediate messages aren't replayed.
+
+    Sequence numbers are per tag, not per publisher, as subscribers see
+    only subscribed tags. Each tag should be published by single
+    publisher.
+
+    :var epoch: publisher epoch
+    :vartype epoch: int
+    :var sequences: tag -> sequence number of the last published message
+    :vartype sequences: dict
+    :var state: tag -> (header, message data) of the last published
+        message, only if snapshots are served
+    :vartype state: dict
+    :var snapshotServer: connection serving snapshots or None
+    """
+
+    def __init__(self, factory, endpoint=None, identity=None,
+                 snapshotEndpoint=None):
+        """
+        Constructor.
+
+        :param factory: ZeroMQ Twisted factory
+        :type factory: :class:`ZmqFactory`
+        :param endpoint: ZeroMQ address for connect/bind
+        :type endpoint:  :class:`ZmqEndpoint`
+        :param identity: socket identity (ZeroMQ)
+        :type identity: str
+        :param snapshotEndpoint: endpoint to serve snapshots on
+        :type snapshotEndpoint: :class:`ZmqEndpoint`
+        """
+        self.epoch = random.getrandbits(64)
+        self.sequences = {}
+        self.state = {}
+        self.snapshotServer = None
+
+        ZmqPubConnection.__init__(self, factory, endpoint, identity)
+
+        if snapshotEndpoint is not None:
+            self.snapshotServer = _ZmqSnapshotServer(self, factory,
+                                                     snapshotEndpoint)
+
+    def shutdown(self):
+        """
+        Shutdown connection and snapshot server.
+        """
+        if self.snapshotServer is not None:
+            self.snapshotServer.shutdown()
+        ZmqPubConnection.shutdown(self)
+
+    def _frame(self, message, tag):
+        """
+        Assign sequence number, remember state, return message parts.
+        """
+        if isinstance(tag, str):
+            tag = tag.encode()
+        if isinstance(message, str):
+            message = message.encode()
+
+        sequence = self.sequences.get(tag, 0) + 1
+        self.sequences[tag] = sequence
+        header = _headerStruct.pack(self.epoch, sequence)
+        if self.snapshotServer is not None:
+            self.state[tag] = (header, message)
+        return [tag, header, message]
+
+    def publish(self, message, tag=b''):
+        """
+        Publish `message` with specified `tag`.
+
+        :param message: message data
+        :type message: str
+        :param tag: message tag
+        :type tag: str
+        """
+        self.send(self._frame(message, tag))
+
+    def publishMany(self, messages):
+        """
+        Publish many messages at once.
+
+        :param messages: list of tuples (message, tag)
+        :type messages: list
+        """
+        self.sendMany([self._frame(message, tag)
+                       for message, tag in messages])
+
+    def _snapshot(self, prefix):
+        """
+        Build snapshot of tags starting with `prefix`.
+
+        :return: list of message parts: (tag, header, message) for each tag
+        """
+        parts = []
+        for tag, (header, message) in self.state.items():
+            if tag.startswith(prefix):
+                parts.extend((tag, header, message))
+        return parts
+
+
+class ZmqReliableSubConnection(ZmqSubConnection):
+    """
+    Subscriber detecting lost messages of :class:`ZmqReliablePubConnection`.
+
+    Sequence number of each message is checked against the last one
+    received for the tag: duplicate and stale messages are dropped, gap
+    is reported to :meth:`gotGap`. Publisher restart (new epoch) isn't
+    considered a gap.
+
+    If `snapshotEndpoint` is passed, subscriber recovers from gaps by
+    requesting snapshot of the tag from publisher: latest message for the
+    tag is delivered if it's newer than the last one received, and
+    messages which arrived in the meantime are processed after snapshot.
+    Snapshot is also requested on each :meth:`subscribe`, so subscriber
+    starts with current state. If snapshot doesn't arrive in
+    :attr:`snapshotTimeout` seconds, waiting messages are delivered
+    without recovery.
+
+    :var snapshotTimeout: timeout for snapshot request (seconds)
+    :vartype snapshotTimeout: float
+    :var sequences: tag -> (epoch, sequence number) of the last message
+    :vartype sequences: dict
+    :var gapCount: number of gaps detected
+    :vartype gapCount: int
+    :var missedCount: number of messages lost in gaps
+    :vartype missedCount: int
+    :var recoveryCount: number of gaps recovered via snapshot
+    :vartype recoveryCount: int
+    :var recoveryFailedCount: number of snapshot requests timed out
+    :vartype recoveryFailedCount: int
+    :var recoveryLatency: time from gap detection to snapshot arrival for
+        the last recovery (seconds)
+    :vartype recoveryLatency: float
+    :var recoveryLatencyMax: maximum of :attr:`recoveryLatency`
+    :vartype recoveryLatencyMax: float
+    :var snapshotClient: connection requesting snapshots or None
+    """
+    snapshotTimeout = 5.0
+
+    def __init__(self, factory, endpoint=None, identity=None,
+                 snapshotEndpoint=None):
+        """
+        Constructor.
+
+        :param factory: ZeroMQ Twisted factory
+        :type factory: :class:`ZmqFactory`
+        :param endpoint: ZeroMQ address for connect/bind
+        :type endpoint:  :class:`ZmqEndpoint`
+        :param identity: socket identity (ZeroMQ)
+        :type identity: str
+        :param snapshotEndpoint: publisher snapshot endpoint
+        :type snapshotEndpoint: :class:`ZmqEndpoint`
+        """
+        self.sequences = {}
+        self.gapCount = 0
+        self.missedCount = 0
+        self.recoveryCount = 0
+        self.recoveryFailedCount = 0
+        self.recoveryLatency = 0.0
+        self.recoveryLatencyMax = 0.0
+        self.snapshotClient = None
+
+        # snapshot ID -> (requested at, is recovery?, timeout call)
+        self._snapshots = {}
+        self._snapshotCounter = itertools.count()
+        # messages received while waiting for snapshots
+        self._buffered = []
+
+        ZmqSubConnection.__init__(self, factory, endpoint, identity)
+
+        if snapshotEndpoint is not None:
+            self.snapshotClient = _ZmqSnapshotClient(self, factory,
+                                                     snapshotEndpoint)
+
+    def shutdown(self):
+        """
+        Shutdown connection and snapshot client.
+        """
+        for _, _, call in self._snapshots.values():
+            call.cancel()
+        self._snapshots.clear()
+        del self._buffered[:]
+
+        if self.snapshotClient is not None:
+            self.snapshotClient.shutdown()
+        ZmqSubConnection.shutdown(self)
+
+    def subscribe(self, tag, handler=None):
+        """
+        Subscribe to messages with specified tag (prefix), requesting
+        snapshot of the tag if snapshot endpoint is set.
+
+        See :meth:`ZmqSubConnection.subscribe`.
+
+        :param tag: message tag
+        :type tag: str
+        :param handler: callable accepting (message, tag)
+        """
+        ZmqSubConnection.subscribe(self, tag, handler)
+        if self.snapshotClient is not None:
+            self._requestSnapshot(tag, False)
+
+    def messageReceived(self, message):
+        """
+        Overridden from :class:`ZmqConnection` to check sequence numbers.
+
+        :param message: message data
+        """
+        if len(message) != 3:
+            return
+        tag, header, payload = message
+        tag, header = to_bytes(tag), to_bytes(header)
+        if self._sequenced(tag, header, payload, True):
+            self._deliver([(payload, tag)])
+
+    def messagesReceived(self, messages):
+        """
+        Overridden from :class:`ZmqConnection` to check sequence numbers
+        of batch of messages.
+
+        :param messages: list of messages
+        """
+        delivered = []
+        for message in messages:
+            if len(message) != 3:
+                continue
+            tag, header, payload = message
+            tag, header = to_bytes(tag), to_bytes(header)
+            if self._sequenced(tag, header, payload, True):
+                delivered.append((payload, tag))
+        if delivered:
+            self._deliver(delivered)
+
+    def _sequenced(self, tag, header, payload, recover):
+        """
+        Check sequence number of the message.
+
+        :return: True if message should be delivered
+        """
+        if self._snapshots:
+            self._buffered.append((tag, header, payload))
+            return False
+
+        epoch, sequence = _headerStruct.unpack(header)
+        last = self.sequences.get(tag)
+        if last is not None and last[0] == epoch:
+            expected = last[1] + 1
+            if sequence < expected:
+                # duplicate or already recovered via snapshot
+                return False
+            if sequence > expected:
+                self.gapCount += 1
+                self.missedCount += sequence - expected
+                self.gotGap(tag, expected, sequence)
+                if recover and self.snapshotClient is not None:
+                    # message is processed again after snapshot, it's
+                    # delivered unless snapshot has the same or newer one
+                    self.sequences[tag] = (epoch, sequence - 1)
+                    self._requestSnapshot(tag, True)
+                    self._buffered.append((tag, header, payload))
+                    return False
+
+        self.sequences[tag] = (epoch, sequence)
+        return True
+
+    def _requestSnapshot(self, prefix, recovery):
+        snapshotId = _snapshotIdStruct.pack(next(self._snapshotCounter))
+        reactor = self.factory.reactor
+        self._snapshots[snapshotId] = (
+            reactor.seconds(), recovery,
+            reactor.callLater(self.snapshotTimeout, self._snapshotTimeout,
+                              snapshotId))
+        self.snapshotClient.send([_SNAPSHOT_REQUEST, snapshotId, prefix])
+
+    def _snapshotTimeout(self, snapshotId):
+        _, recovery, _ = self._snapshots.pop(snapshotId)
+        if recovery:
+            self.recoveryFailedCount += 1
+        if not self._snapshots:
+            self._flush(False)
+
+    def _gotSnapshot(self, message):
+        """
+        Snapshot arrived: [snapshot ID, (tag, header, message)...].
+        """
+        pending = self._snapshots.pop(message[0], None)
+        if pending is None:
+            # timed out
+            return
+        requestedAt, recovery, call = pending
+        call.cancel()
+
+        delivered = []
+        for i in range(1, len(message) - 2, 3):
+            tag, header, payload = message[i:i + 3]
+            tag, header = to_bytes(tag), to_bytes(header)
+            epoch, sequence = _headerStruct.unpack(header)
+            last = self.sequences.get(tag)
+            if last is None or last[0] != epoch or last[1] < sequence:
+                self.sequences[tag] = (epoch, sequence)
+                delivered.append((payload, tag))
+
+        if recovery:
+            self.recoveryCount += 1
+            self.recoveryLatency = \
+                self.factory.reactor.seconds() - requestedAt
+            self.recoveryLatencyMax = max(self.recoveryLatencyMax,
+                                          self.recoveryLatency)
+
+        if delivered:
+            self._deliver(delivered)
+        if not self._snapshots:
+            self._flush(True)
+
+    def _flush(self, recover):
+        """
+        Process messages received while waiting for snapshots.
+        """
+        buffered, self._buffered = self._buffered, []
+        delivered = []
+        for tag, header, payload in buffered:
+            if self._sequenced(tag, header, payload, recover):
+                delivered.append((payload, tag))
+        if delivered:
+            self._deliver(delivered)
+
+    def _deliver(self, messages):
+        """
+        Pass messages in order to conflation, :meth:`gotMessages`,
+        registered handlers or :meth:`gotMessage`.
+
+        :param messages: list of tuples (message, tag)
+        """
+        if self.conflateTopics:
+            for message, tag in messages:
+                self._conflate(message, tag)
+        elif self.messageBatchSize:
+            self.gotMessages(messages)
+        else:
+            for message, tag in messages:
+                self._dispatch(message, tag)
+
+    def gotGap(self, tag, expected, received):
+        """
+        Called when messages of the tag were lost.
+
+        :param tag: message tag
+        :type tag: str
+        :param expected: expected sequence number
+        :type expected: int
+        :param received: sequence number of received message
+        :type received: int
+        """
@@ -3,14 +3,21 @@ ZeroMQ REQ-REP wrappers.
 """
 from __future__ import unicode_literals
 
+import heapq
+import itertools
+import os
+import struct
 import uuid
 import warnings
+from collections import OrderedDict, deque
 
 from zmq import constants
 
-from twisted.internet import defer, reactor
+from twisted.internet import defer, threads
+from twisted.python import log
 
 from txzmq.connection import ZmqConnection
+from txzmq.timerwheel import TimerWheel
 
 
 class ZmqRequestTimeoutError(Exception):
@@ -19,6 +26,88 @@ class ZmqRequestTimeoutError(Exception):
     """
 
 
+class ZmqUnknownRequestError(KeyError):
+    """
+    Reply is sent to request which routing info is unknown: request
+    was already replied or routing info was evicted (see
+    :attr:`ZmqREPConnection.routingInfoMaxSize` and
+    :attr:`ZmqREPConnection.routingInfoTTL`).
+    """
+
+
+_messageIdStruct = struct.Struct('!8sQ')
+
+# message ID marking batch of requests (replies)
+_BATCH_ID = b'\x00txzmq-batch'
+_batchCountStruct = struct.Struct('!I')
+
+
+def _packBatch(requests):
+    """
+    Pack batch of requests (replies) into message parts.
+
+    Each request is packed as message ID, number of message parts (4 bytes)
+    and message parts.
+
+    :param requests: list of tuples (message ID, list of message parts)
+    :return: list of message parts
+    """
+    frames = []
+    for messageId, messageParts in requests:
+        frames.append(messageId)
+        frames.append(_batchCountStruct.pack(len(messageParts)))
+        frames.extend(messageParts)
+    return frames
+
+
+def _unpackBatch(frames):
+    """
+    Unpack batch of requests (replies) packed by :func:`_packBatch`.
+
+    :param frames: list of message parts
+    :return: list of tuples (message ID, list of message parts)
+    """
+    requests = []
+    i, total = 0, len(frames)
+    while i < total:
+        count, = _batchCountStruct.unpack(frames[i + 1])
+        requests.append((frames[i], frames[i + 2:i + 2 + count]))
+        i += 2 + count
+    return requests
+
+
+class _RequestState(object):
+    """
+    State of request sent with hedging or retries enabled: all the attempts
+    (each with separate message ID) share single Deferred.
+    """
+    __slots__ = ('d', 'parts', 'timeout', 'priority', 'ids', 'sentAt',
+                 'retries', 'hedgeCall')
+
+    def __init__(self, d, parts, timeout, priority):
+        self.d = d
+        self.parts = parts
+        self.timeout = timeout
+        self.priority = priority
+        self.ids = []
+        self.sentAt = {}
+        self.retries = 0
+        self.hedgeCall = None
+
+
+def unpackMessageId(messageId):
+    """
+    Parse message ID generated with
+    :attr:`ZmqREQConnection.fastMessageIds` enabled.
+
+    :param messageId: message ID (16 bytes)
+    :type messageId: str
+    :return: tuple (prefix, counter), where prefix is random per-connection
+        8-byte string and counter is request sequence number
+    """
+    return _messageIdStruct.unpack(messageId)
+
+
 class ZmqREQConnection(ZmqConnection):
     """
     A Request ZeroMQ connection.
@@ -33,9 +122,79 @@ class ZmqREQConnection(ZmqConnection):
     :var defaultRequestTimeout: default timeout for requests, disabled
         by default (seconds)
     :type defaultRequestTimeout: float
+    :var requestTimeoutResolution: if set, request timeouts are handled
+        by :class:`txzmq.timerwheel.TimerWheel` with specified resolution
+        (seconds) instead of separate reactor timer for each request,
+        which is cheaper with many requests in flight
+    :type requestTimeoutResolution: float
+    :var fastMessageIds: if set, message IDs are built from random
+        per-connection prefix and 64-bit counter (see
+        :func:`unpackMessageId`) instead of UUIDs: this doesn't require
+        system calls per request and IDs are never reused
+    :type fastMessageIds: bool
+    :var maxInFlight: maximum number of requests sent but not replied yet,
+        requests over the limit wait in local queue ordered by priority,
+        then by time of :meth:`sendMsg` call; 0 means no limit
+    :type maxInFlight: int
+    :var requestsQueued: number of requests which had to wait in local queue
+    :type requestsQueued: int
+    :var requestQueueWaitTime: total time requests spent in local queue
+        (seconds)
+    :type requestQueueWaitTime: float
+    :var requestQueueMaxWaitTime: maximum time request spent in local queue
+        (seconds)
+    :type requestQueueMaxWaitTime: float
+    :var batchSize: if set, requests are gathered into batches of up to
+        that many requests, each batch is sent as single ZeroMQ message
+        (:class:`ZmqREPConnection` unpacks batches and replies in batches)
+    :type batchSize: int
+    :var batchInterval: time to gather requests into batch (seconds), 0
+        means requests sent during one reactor iteration are batched
+    :type batchInterval: float
+    :var hedgeDelay: if set, duplicate of request (with different message
+        ID) is sent if no reply came in that many seconds, first reply wins
+    :type hedgeDelay: float
+    :var hedgePercentile: if set, duplicate of request is sent after
+        specified percentile (e.g. 95) of recent request latencies instead of
+        :attr:`hedgeDelay` (which is used until :attr:`latencyMinSamples`
+        latencies are collected)
+    :type hedgePercentile: float
+    :var latencyWindow: number of recent request latencies to keep
+    :type latencyWindow: int
+    :var latencyMinSamples: minimum number of latencies to estimate
+        :attr:`hedgePercentile`
+    :type latencyMinSamples: int
+    :var maxRetries: maximum number of times request is resent when it
+        times out, request timeout applies to each attempt
+    :type maxRetries: int
+    :var retryBudget: number of retries (and hedged requests) allowed per
+        request on average, so that retries don't amplify the load when
+        all the peers are slow
+    :type retryBudget: float
+    :var retryBudgetBurst: maximum number of retries accumulated in budget
+    :type retryBudgetBurst: float
+    :var requestsHedged: number of duplicate requests sent
+    :type requestsHedged: int
+    :var requestsRetried: number of requests resent after timeout
+    :type requestsRetried: int
+    :var retryBudgetExhausted: number of retries (hedges) not sent
+        because of exhausted budget
+    :type retryBudgetExhausted: int
     """
     socketType = constants.DEALER
     defaultRequestTimeout = None
+    requestTimeoutResolution = None
+    fastMessageIds = False
+    maxInFlight = 0
+    batchSize = 0
+    batchInterval = 0
+    hedgeDelay = None
+    hedgePercentile = None
+    latencyWindow = 1000
+    latencyMinSamples = 20
+    maxRetries = 0
+    retryBudget = 0.2
+    retryBudgetBurst = 10.0
 
     # the number of new UUIDs to generate when the pool runs out of them
     UUID_POOL_GEN_SIZE = 5
@@ -43,20 +202,89 @@ class ZmqREQConnection(ZmqConnection):
     def __init__(self, *args, **kwargs):
         self._requests = {}
         self._uuids = []
+        self._timeouts = None
+        self._idPrefix = os.urandom(8)
+        self._idCounter = itertools.count()
+        self._pending = []  # heap of requests waiting for in-flight slot
+        self._pendingIds = set()
+        self._pendingCounter = itertools.count()
+        self.requestsQueued = 0
+        self.requestQueueWaitTime = 0.0
+        self.requestQueueMaxWaitTime = 0.0
+        self._batch = []
+        self._batchCall = None
+        # message ID -> state, for requests with hedging or retries
+        self._states = {}
+        self._latencies = deque(maxlen=self.latencyWindow)
+        self._latencyUpdates = 0
+        self._hedgeEstimate = None
+        self._retryTokens = self.retryBudgetBurst
+        self.requestsHedged = 0
+        self.requestsRetried = 0
+        self.retryBudgetExhausted = 0
 
         ZmqConnection.__init__(self, *args, **kwargs)
 
+        if self.requestTimeoutResolution is not None:
+            self._timeouts = TimerWheel(self.factory.reactor,
+                                        self.requestTimeoutResolution)
+
+    def shutdown(self):
+        """
+        Shutdown (close) connection and ZeroMQ socket.
+
+        Requests waiting in local queue (see :attr:`maxInFlight`) or
+        in batch (see :attr:`batchSize`) are cancelled, requests already
+        sent fail with :class:`ZmqRequestTimeoutError` when their timeout
+        expires (timer wheel, if used, keeps ticking until then).
+        """
+        if self._batchCall is not None:
+            self._batchCall.cancel()
+            self._batchCall = None
+
+        for state in self._states.values():
+            if state.hedgeCall is not None:
+                state.hedgeCall.cancel()
+                state.hedgeCall = None
+
+        ZmqConnection.shutdown(self)
+
+        unsent = [self._requests[messageId][0]
+                  for messageId in self._pendingIds]
+        unsent.extend(self._requests[messageId][0]
+                      for messageId, _ in self._batch
+                      if messageId in self._requests)
+        self._pending = []
+        self._batch = []
+        for d in unsent:
+            d.cancel()
+
+    def _callLater(self, delay, func, *args):
+        """
+        Schedule request timeout, either via timer wheel or reactor.
+
+        :return: scheduled call, supports `active()` and `cancel()`
+        """
+        if self._timeouts is not None:
+            return self._timeouts.callLater(delay, func, *args)
+        return self.factory.reactor.callLater(delay, func, *args)
+
     def _getNextId(self):
         """
         Returns an unique id.
 
         By default, generates pool of UUID in increments
-        of ``UUID_POOL_GEN_SIZE``. Could be overridden to
+        of ``UUID_POOL_GEN_SIZE``. If :attr:`fastMessageIds` is set,
+        packs per-connection prefix and counter. Could be overridden to
         provide custom ID generation.
 
         :return: generated unique "on the wire" message ID
         :rtype: str
         """
+        if self.fastMessageIds:
+            return _messageIdStruct.pack(self._idPrefix,
+                                         next(self._idCounter))
+
         if not self._uuids:
             for _ in range(self.UUID_POOL_GEN_SIZE):
                 self._uuids.append(uuid.uuid4().bytes)
@@ -66,9 +294,14 @@ class ZmqREQConnection(ZmqConnection):
         """
         Release message ID to the pool.
 
+        IDs generated with :attr:`fastMessageIds` are never reused.
+
         @param msgId: message ID, no longer on the wire
         @type msgId: C{str}
         """
+        if self.fastMessageIds:
+            return
+
         self._uuids.append(msgId)
         if len(self._uuids) > 2 * self.UUID_POOL_GEN_SIZE:
             self._uuids[-self.UUID_POOL_GEN_SIZE:] = []
@@ -80,11 +313,37 @@ class ZmqREQConnection(ZmqConnection):
         @param msgId: message ID to cancel
         @type msgId: C{str}
         """
+        state = self._states.get(msgId)
+        if state is not None:
+            self._dropAttempts(state)
+        else:
+            self._dropAttempt(msgId)
+
+        self._sendPending()
+
+    def _dropAttempt(self, msgId):
+        """
+        Forget request (attempt) with specified message ID.
+        """
         _, canceller = self._requests.pop(msgId, (None, None))
+        self._pendingIds.discard(msgId)
+        self._states.pop(msgId, None)
 
         if canceller is not None and canceller.active():
             canceller.cancel()
 
+    def _dropAttempts(self, state):
+        """
+        Forget all the attempts of hedged (retried) request.
+        """
+        if state.hedgeCall is not None:
+            if state.hedgeCall.active():
+                state.hedgeCall.cancel()
+            state.hedgeCall = None
+
+        for msgId in state.ids:
+            self._dropAttempt(msgId)
+
     def _timeoutRequest(self, msgId):
         """
         Cancel timedout request.
@@ -92,17 +351,214 @@ class ZmqREQConnection(ZmqConnection):
         @type msgId: C{str}
         """
         d, _ = self._requests.pop(msgId, (None, None))
-        if not d.called:
+        sent = msgId not in self._pendingIds
+        self._pendingIds.discard(msgId)
+        # keep state reachable via original message ID (used by canceller)
+        state = self._states.get(msgId)
+
+        if state is not None and d is not None:
+            if any(other in self._requests for other in state.ids):
+                # hedged request is still in flight
+                return
+
+            # request timed out in local queue isn't retried
+            if sent and self.factory is not None and \
+                    state.retries < self.maxRetries and self._spendRetry():
+                state.retries += 1
+                self.requestsRetried += 1
+                self._attempt(state)
+                return
+
+            self._dropAttempts(state)
+
+        self._sendPending()
+
+        if d is not None and not d.called:
             d.errback(ZmqRequestTimeoutError(msgId))
 
+    def _spendRetry(self):
+        """
+        Withdraw one retry from retry budget.
+
+        :return: True if retry is allowed
+        :rtype: bool
+        """
+        if self._retryTokens < 1.0:
+            self.retryBudgetExhausted += 1
+            return False
+
+        self._retryTokens -= 1.0
+        return True
+
+    def _attempt(self, state):
+        """
+        Send another attempt of hedged (retried) request with new
+        message ID, subject to :attr:`maxInFlight`.
+        """
+        messageId = self._getNextId()
+        canceller = None
+        if state.timeout is not None:
+            canceller = self._callLater(state.timeout, self._timeoutRequest,
+                                        messageId)
+        state.ids.append(messageId)
+        self._states[messageId] = state
+        # repeated attempts don't wait behind queued requests, but still
+        # need a free in-flight slot
+        self._submit(messageId, state.d, canceller, state.parts,
+                     state.priority, queued=False)
+
+    def _hedge(self, state):
+        """
+        No reply came in hedge delay, send duplicate request.
+        """
+        state.hedgeCall = None
+        if state.d.called or not self._spendRetry():
+            return
+
+        self.requestsHedged += 1
+        self._attempt(state)
+
+    def _currentHedgeDelay(self):
+        """
+        Delay after which duplicate request is sent.
+
+        :return: delay (seconds) or None if no hedging should be done
+        """
+        if self._hedgeEstimate is not None:
+            return self._hedgeEstimate
+        return self.hedgeDelay
+
+    def _recordLatency(self, latency):
+        """
+        Remember latency of the request, update :attr:`hedgePercentile`
+        estimate every so often.
+        """
+        latencies = self._latencies
+        latencies.append(latency)
+        self._latencyUpdates += 1
+
+        if self.hedgePercentile is None or \
+                len(latencies) < self.latencyMinSamples or \
+                self._latencyUpdates < self.latencyMinSamples:
+            return
+
+        self._latencyUpdates = 0
+        ordered = sorted(latencies)
+        index = int(len(ordered) * self.hedgePercentile / 100.0)
+        self._hedgeEstimate = ordered[min(index, len(ordered) - 1)]
+
+    @property
+    def pendingRequests(self):
+        """
+        Number of requests waiting in local queue for in-flight slot,
+        see :attr:`maxInFlight`.
+
+        :rtype: int
+        """
+        return len(self._pendingIds)
+
+    def _inFlight(self):
+        """
+        Number of requests sent, but not replied yet.
+        """
+        return len(self._requests) - len(self._pendingIds)
+
+    def _sendPending(self):
+        """
+        Send requests from local queue while there are free in-flight slots.
+        """
+        if self.factory is None:
+            # connection was shut down
+            return
+
+        while self._pending and (not self.maxInFlight or
+                                 self._inFlight() < self.maxInFlight):
+            _, _, messageId, messageParts, queuedAt = heapq.heappop(
+                self._pending)
+            if messageId not in self._pendingIds:
+                # cancelled or timed out while waiting
+                continue
+
+            self._pendingIds.discard(messageId)
+
+            waitTime = self.factory.reactor.seconds() - queuedAt
+            self.requestQueueWaitTime += waitTime
+            self.requestQueueMaxWaitTime = max(self.requestQueueMaxWaitTime,
+                                               waitTime)
+
+            self._sendRequest(messageId, messageParts)
+
+    def _sendRequest(self, messageId, messageParts):
+        """
+        Send request to ZeroMQ or add it to the batch of requests,
+        if :attr:`batchSize` is set.
+
+        :param messageId: message ID
+        :param messageParts: list of message parts
+        """
+        if self._states:
+            state = self._states.get(messageId)
+            if state is not None:
+                self._attemptSent(state, messageId)
+
+        if not self.batchSize:
+            self.sendEnvelope((messageId, b''), messageParts)
+            return
+
+        self._batch.append((messageId, messageParts))
+        if len(self._batch) >= self.batchSize:
+            self._flushBatch()
+        elif self._batchCall is None:
+            self._batchCall = self.factory.reactor.callLater(
+                self.batchInterval, self._flushBatch)
+
+    def _attemptSent(self, state, messageId):
+        """
+        Attempt of hedged (retried) request is being sent: record send
+        time and schedule hedging.
+        """
+        state.sentAt[messageId] = self.factory.reactor.seconds()
+
+        if state.hedgeCall is None and len(state.ids) == 1:
+            delay = self._currentHedgeDelay()
+            if delay is not None:
+                state.hedgeCall = self.factory.reactor.callLater(
+                    delay, self._hedge, state)
+
+    def _flushBatch(self):
+        """
+        Send gathered batch of requests.
+        """
+        if self._batchCall is not None:
+            if self._batchCall.active():
+                self._batchCall.cancel()
+            self._batchCall = None
+
+        # skip requests cancelled or timed out while waiting in batch
+        batch = [request for request in self._batch
+                 if request[0] in self._requests]
+        self._batch = []
+
+        if len(batch) == 1:
+            messageId, messageParts = batch[0]
+            self.send([messageId, b''] + messageParts)
+        elif batch:
+            self.send([_BATCH_ID, b''] + _packBatch(batch))
+
     def sendMsg(self, *messageParts, **kwargs):
         """
         Send request and deliver response back when available.
 
         :param messageParts: message data
         :type messageParts: tuple
-        :param timeout: as keyword argument, timeout on request
+        :param timeout: as keyword argument, timeout on request (includes
+            time spent waiting in local queue), with :attr:`maxRetries`
+            set it's timeout for each attempt
         :type timeout: float
+        :param priority: as keyword argument, priority of request when
+            waiting in local queue (see :attr:`maxInFlight`), requests with
+            lower values are sent first
+        :type priority: int
         :return: Deferred that will fire when response comes back
         """
         messageId = self._getNextId()
@@ -111,16 +567,46 @@ class ZmqREQConnection(ZmqConnection):
         timeout = kwargs.pop('timeout', None)
         if timeout is None:
             timeout = self.defaultRequestTimeout
+        priority = kwargs.pop('priority', 0)
         assert len(kwargs) == 0, "Unsupported keyword argument"
 
         canceller = None
         if timeout is not None:
-            canceller = reactor.callLater(timeout, self._timeoutRequest,
-                                          messageId)
+            canceller = self._callLater(timeout, self._timeoutRequest,
+                                        messageId)
+
+        if self.maxRetries or self.hedgeDelay is not None or \
+                self.hedgePercentile is not None:
+            self._retryTokens = min(self._retryTokens + self.retryBudget,
+                                    self.retryBudgetBurst)
+            state = _RequestState(d, list(messageParts), timeout, priority)
+            state.ids.append(messageId)
+            self._states[messageId] = state
+
+        self._submit(messageId, d, canceller, list(messageParts), priority)
+        return d
+
+    def _submit(self, messageId, d, canceller, messageParts, priority,
+                queued=True):
+        """
+        Send request or put it to local queue if there are no free
+        in-flight slots (see :attr:`maxInFlight`).
+
+        :param queued: should request wait for already queued requests
+        :type queued: bool
+        """
+        if self.maxInFlight and ((queued and self._pendingIds) or
+                                 self._inFlight() >= self.maxInFlight):
+            self.requestsQueued += 1
+            self._pendingIds.add(messageId)
+            heapq.heappush(self._pending, (
+                priority, next(self._pendingCounter), messageId,
+                messageParts, self.factory.reactor.seconds()))
+            self._requests[messageId] = (d, canceller)
+            return
 
         self._requests[messageId] = (d, canceller)
-        self.send([messageId, b''] + list(messageParts))
-        return d
+        self._sendRequest(messageId, messageParts)
 
     def messageReceived(self, message):
         """
@@ -130,7 +616,19 @@ class ZmqREQConnection(ZmqConnection):
 
         :param message: message data
         """
-        msgId, msg = message[0], message[2:]
+        if message[0] == _BATCH_ID:
+            for msgId, msg in _unpackBatch(message[2:]):
+                self._gotReply(msgId, msg)
+        else:
+            self._gotReply(message[0], message[2:])
+
+    def _gotReply(self, msgId, msg):
+        """
+        Pass reply back to the requestor.
+
+        :param msgId: message ID
+        :param msg: list of message parts
+        """
         self._releaseId(msgId)
         d, canceller = self._requests.pop(msgId, (None, None))
 
@@ -141,6 +639,17 @@ class ZmqREQConnection(ZmqConnection):
             # reply came for timed out or cancelled request, drop it silently
             return
 
+        if self._states:
+            state = self._states.pop(msgId, None)
+            if state is not None:
+                sentAt = state.sentAt.get(msgId)
+                if sentAt is not None:
+                    self._recordLatency(
+                        self.factory.reactor.seconds() - sentAt)
+                # drop other attempts, their replies will be ignored
+                self._dropAttempts(state)
+
+        self._sendPending()
         d.callback(msg)
 
 
@@ -150,14 +659,68 @@ class ZmqREPConnection(ZmqConnection):
 
     This is implemented with an underlying ROUTER socket, but the semantics
     are close to REP socket.
+
+    :var autoReply: if set, value returned by :meth:`gotMessage` (or
+        result of returned Deferred) is sent as reply automatically
+    :type autoReply: bool
+    :var maxConcurrentRequests: with :attr:`autoReply` set, maximum number
+        of requests being handled at once, other requests wait in local
+        queue and reading of new requests is paused; 0 means no limit
+    :type maxConcurrentRequests: int
+    :var threadPool: with :attr:`autoReply` set, thread pool
+        (:class:`twisted.python.threadpool.ThreadPool`) to call
+        :meth:`gotMessage` in
+    :var routingInfoMaxSize: maximum number of requests waiting for reply,
+        routing info for the oldest requests is evicted when limit is
+        reached; 0 means no limit
+    :type routingInfoMaxSize: int
+    :var routingInfoTTL: time (seconds) to keep routing info for request
+        waiting for reply, None means forever
+    :type routingInfoTTL: float
+    :var routingInfoEvicted: number of requests which routing info was
+        evicted before reply was sent
+    :type routingInfoEvicted: int
+
+    Batches of requests sent by :class:`ZmqREQConnection` with
+    :attr:`~ZmqREQConnection.batchSize` set are unpacked and passed to
+    :meth:`gotMessage` one by one, replies to them are gathered during
+    reactor iteration and sent back in batches.
     """
     socketType = constants.ROUTER
+    autoReply = False
+    maxConcurrentRequests = 0
+    threadPool = None
+    routingInfoMaxSize = 0
+    routingInfoTTL = None
 
     def __init__(self, *args, **kwargs):
-        self._routingInfo = {}  # keep track of routing info
+        # keep track of routing info:
+        # message ID -> (expiry time, routing, batched)
+        self._routingInfo = OrderedDict()
+        # replies to batched requests: routing -> [(message ID, parts)]
+        self._replyBatches = OrderedDict()
+        self._replyBatchCall = None
+        self.routingInfoEvicted = 0
+        self._handlerQueue = deque()
+        self._activeRequests = 0
+        self._runningHandlers = False
+        # reading is paused by concurrency limit and/or by consumer
+        self._handlersPaused = False
+        self._consumerPaused = False
 
         ZmqConnection.__init__(self, *args, **kwargs)
 
+    def shutdown(self):
+        """
+        Shutdown connection, dropping replies waiting to be batched.
+        """
+        if self._replyBatchCall is not None:
+            self._replyBatchCall.cancel()
+            self._replyBatchCall = None
+        self._replyBatches.clear()
+
+        ZmqConnection.shutdown(self)
+
     def reply(self, messageId, *messageParts):
         """
         Send reply to request with specified ``messageId``.
@@ -166,9 +729,74 @@ class ZmqREPConnection(ZmqConnection):
         :type messageId: str
         :param messageParts: message data
         :type messageParts: list
+        :raises ZmqUnknownRequestError: if request was already replied or
+            routing info was evicted
+        """
+        try:
+            expires, routingInfo, batched = self._routingInfo.pop(messageId)
+        except KeyError:
+            raise ZmqUnknownRequestError(messageId)
+
+        if expires is not None and expires <= self.factory.reactor.seconds():
+            self.routingInfoEvicted += 1
+            raise ZmqUnknownRequestError(messageId)
+
+        if batched:
+            self._replyBatches.setdefault(routingInfo, []).append(
+                (messageId, list(messageParts)))
+            if self._replyBatchCall is None:
+                self._replyBatchCall = self.factory.reactor.callLater(
+                    0, self._flushReplies)
+            return
+
+        self.sendEnvelope(routingInfo + (messageId, b''), messageParts)
+
+    def _flushReplies(self):
+        """
+        Send replies to batched requests gathered so far.
+        """
+        self._replyBatchCall = None
+        batches, self._replyBatches = self._replyBatches, OrderedDict()
+
+        for routingInfo, batch in batches.items():
+            if len(batch) == 1:
+                messageId, messageParts = batch[0]
+                self.send(list(routingInfo) + [messageId, b''] + messageParts)
+            else:
+                self.send(list(routingInfo) + [_BATCH_ID, b''] +
+                          _packBatch(batch))
+
+    def _storeRoutingInfo(self, messageId, routingInfo, batched=False):
         """
-        routingInfo = self._routingInfo.pop(messageId)
-        self.send(routingInfo + [messageId, b''] + list(messageParts))
+        Remember routing info for the request, evicting expired
+        and excess entries.
+
+        :param messageId: message uuid
+        :type messageId: str
+        :param routingInfo: routing info (list of peer identities)
+        :type routingInfo: tuple
+        :param batched: was request received as part of the batch?
+        :type batched: bool
+        """
+        table = self._routingInfo
+
+        expires = None
+        if self.routingInfoTTL is not None:
+            now = self.factory.reactor.seconds()
+            # entries are ordered by arrival, so they expire in order
+            while table:
+                oldest = next(iter(table))
+                if table[oldest][0] > now:
+                    break
+                del table[oldest]
+                self.routingInfoEvicted += 1
+            expires = now + self.routingInfoTTL
+
+        table[messageId] = (expires, routingInfo, batched)
+
+        if self.routingInfoMaxSize and len(table) > self.routingInfoMaxSize:
+            table.popitem(last=False)
+            self.routingInfoEvicted += 1
 
     def messageReceived(self, message):
         """
@@ -176,13 +804,34 @@ class ZmqREPConnection(ZmqConnection):
 
         :param message: message data
         """
-        i = message.index(b'')
-        assert i > 0
-        (routingInfo, msgId, payload) = (
-            message[:i - 1], message[i - 1], message[i + 1:])
-        msgParts = payload[0:]
-        self._routingInfo[msgId] = routingInfo
-        self.gotMessage(msgId, *msgParts)
+        # common case: single peer identity frame, avoid scanning
+        if message[2] == b'':
+            i = 2
+            routingInfo = (message[0],)
+        else:
+            i = message.index(b'')
+            assert i > 0
+            routingInfo = tuple(message[:i - 1])
+        msgId = message[i - 1]
+
+        if msgId == _BATCH_ID:
+            for msgId, msgParts in _unpackBatch(message[i + 1:]):
+                self._gotRequest(routingInfo, msgId, msgParts, True)
+        else:
+            self._gotRequest(routingInfo, msgId, message[i + 1:], False)
+
+    def _gotRequest(self, routingInfo, msgId, msgParts, batched):
+        """
+        Dispatch single (possibly unpacked from batch) request.
+        """
+        self._storeRoutingInfo(msgId, routingInfo, batched)
+
+        if not self.autoReply:
+            self.gotMessage(msgId, *msgParts)
+            return
+
+        self._handlerQueue.append((msgId, msgParts))
+        self._runHandlers()
 
     def gotMessage(self, messageId, *messageParts):
         """
@@ -191,12 +840,113 @@ class ZmqREPConnection(ZmqConnection):
         Override this method in subclass and reply using
         :meth:`reply` using the same ``messageId``.
 
+        If :attr:`autoReply` is set, return reply instead: either single
+        message part, list of message parts or Deferred firing with any of
+        those. Returning None means no automatic reply is sent.
+
         :param messageId: message uuid
         :type messageId: str
         :param messageParts: message data
         """
         raise NotImplementedError(self)
 
+    def _dispatchRequest(self, messageId, *messageParts):
+        """
+        Call :meth:`gotMessage` in :attr:`autoReply` mode.
+
+        By default, :meth:`gotMessage` is called directly or in
+        :attr:`threadPool`. Could be overridden to hand off requests
+        to some other executor (e.g. process pool).
+
+        :return: Deferred firing with reply
+        """
+        if self.threadPool is not None:
+            return threads.deferToThreadPool(
+                self.factory.reactor, self.threadPool, self.gotMessage,
+                messageId, *messageParts)
+
+        return defer.maybeDeferred(self.gotMessage, messageId, *messageParts)
+
+    def _runHandlers(self):
+        """
+        Start handling queued requests while concurrency limit allows.
+        """
+        if self._runningHandlers or self.factory is None:
+            return
+
+        self._runningHandlers = True
+        try:
+            while self._handlerQueue and (
+                    not self.maxConcurrentRequests or
+                    self._activeRequests < self.maxConcurrentRequests):
+                msgId, msgParts = self._handlerQueue.popleft()
+                self._activeRequests += 1
+                d = self._dispatchRequest(msgId, *msgParts)
+                d.addCallback(self._autoReply, msgId)
+                d.addErrback(self._handlerFailed, msgId)
+                d.addBoth(self._handlerDone)
+        finally:
+            self._runningHandlers = False
+
+        if self.factory is None:
+            return
+
+        if self._handlerQueue and not self._handlersPaused:
+            self._handlersPaused = True
+            ZmqConnection.pauseProducing(self)
+        elif not self._handlerQueue and self._handlersPaused:
+            self._handlersPaused = False
+            if not self._consumerPaused:
+                ZmqConnection.resumeProducing(self)
+
+    def pauseProducing(self):
+        """
+        Pause reading of incoming requests.
+
+        Implementation of :tm:`IPushProducer
+        <internet.interfaces.IPushProducer>`.
+        """
+        self._consumerPaused = True
+        ZmqConnection.pauseProducing(self)
+
+    def resumeProducing(self):
+        """
+        Resume reading of incoming requests, unless it is paused
+        by :attr:`maxConcurrentRequests` limit.
+
+        Implementation of :tm:`IPushProducer
+        <internet.interfaces.IPushProducer>`.
+        """
+        self._consumerPaused = False
+        if not self._handlersPaused:
+            ZmqConnection.resumeProducing(self)
+
+    def _autoReply(self, result, messageId):
+        """
+        Send result of request handling as reply.
+        """
+        if result is None or self.factory is None:
+            return
+
+        if not isinstance(result, (list, tuple)):
+            result = [result]
+        self.reply(messageId, *result)
+
+    def _handlerFailed(self, failure, messageId):
+        """
+        Request handling (or sending reply) failed, log the error and
+        forget the request.
+        """
+        self._routingInfo.pop(messageId, None)
+        log.err(failure, "Error while handling request %r" % (messageId,))
+
+    def _handlerDone(self, _):
+        """
+        Request handling finished, start handling next request.
+        """
+        self._activeRequests -= 1
+        self._runHandlers()
+
 
 class ZmqXREPConnection(ZmqREPConnection):
     """
@@ -1,10 +1,38 @@
 """
 ZeroMQ ROUTER and DEALER connection types.
 """
+import itertools
+import os
+import random
+import struct
 
 from zmq import constants
 
+from twisted.internet import defer
+
 from txzmq.connection import ZmqConnection
+from txzmq.req_rep import ZmqRequestTimeoutError
+
+
+class ZmqNoPeersError(Exception):
+    """
+    Request can't be sent: no peers known yet.
+    """
+
+
+class ZmqPeerSelection(object):
+    """
+    Strategy to select peer for the request in
+    L{ZmqLoadBalancingConnection}.
+    """
+    powerOfTwoChoices = "p2c"
+    """
+    Pick two random peers, send to the less loaded one: O(1) per request.
+    """
+    leastLoaded = "least-loaded"
+    """
+    Send to the least loaded peer: O(number of peers) per request.
+    """
 
 
 # TODO: ideally, all connection classes would inherit from this in the future
@@ -36,14 +64,17 @@ class ZmqBase(ZmqConnection):
         """
         self.sendMultipart([message])
 
-    def sendMultipart(self, parts):
+    def sendMultipart(self, parts, copy=True, track=False):
         """
         Provides a higher level wrapper over ZmqConnection.send for sending
         multipart messages.
 
         @param parts: message data
+        @param copy: should the message be sent in copying manner?
+        @param track: track sending of message, see ZmqConnection.send
+        @return: Deferred if C{track} is True, None otherwise
         """
-        self.send(parts)
+        return self.send(parts, copy=copy, track=track)
 
     def messageReceived(self, message):
         """
@@ -74,11 +105,264 @@ class ZmqRouterConnection(ZmqBase):
     socketType = constants.ROUTER
 
     def sendMsg(self, recipientId, message):
-        self.send([recipientId, message])
+        self.sendEnvelope((recipientId,), (message,))
+
+    def sendMultipart(self, recipientId, parts, copy=True, track=False):
+        if track:
+            return self.send([recipientId] + list(parts), copy=copy,
+                             track=track)
+        self.sendEnvelope((recipientId,), parts, copy=copy)
+
+    # messageReceived is inherited: gotMessage(senderId, *parts)
+
+
+class _PeerStats(object):
+    """
+    Load and latency statistics of single peer.
+    """
+    __slots__ = ('outstanding', 'latency', 'requests')
+
+    def __init__(self):
+        self.outstanding = 0
+        self.latency = None
+        self.requests = 0
+
+
+class ZmqLoadBalancingConnection(ZmqRouterConnection):
+    """
+    Client ROUTER connection which balances requests across peers
+    (workers, see L{ZmqWorkerConnection}) according to their load
+    and latency.
+
+    Peers are registered as their messages arrive (worker socket sends
+    empty message on connect, see C{ZMQ_PROBE_ROUTER}). For each peer
+    number of outstanding requests and EWMA of reply latency are kept,
+    peer load is estimated as C{latency * (outstanding + 1)}, so faster
+    peers get proportionally more requests. Idle peers which haven't
+    replied yet are probed first.
+
+    Requests are sent as C{[peerId, messageId, '', parts...]}, replies are
+    expected as C{[peerId, messageId, '', parts...]}.
+
+    @cvar peerSelection: peer selection strategy, see L{ZmqPeerSelection}
+    @cvar latencyDecay: EWMA smoothing factor for latency (0..1), higher
+        values make latency estimate react faster
+    @cvar defaultRequestTimeout: default timeout for requests (seconds),
+        timed out request is accounted to peer as latency of C{timeout}
+    @ivar peers: peer identity -> statistics
+    """
+    peerSelection = ZmqPeerSelection.powerOfTwoChoices
+    latencyDecay = 0.3
+    defaultRequestTimeout = None
+
+    _messageIdStruct = struct.Struct('!8sQ')
+
+    def __init__(self, *args, **kwargs):
+        self.peers = {}
+        self._peerIds = []
+        self._requests = {}
+        self._latency = None
+        self._idPrefix = os.urandom(8)
+        self._idCounter = itertools.count()
+        self._random = random.Random()
+
+        ZmqRouterConnection.__init__(self, *args, **kwargs)
+
+    def addPeer(self, peerId):
+        """
+        Register peer with known identity.
+
+        @param peerId: peer identity
+        """
+        if peerId not in self.peers:
+            self.peers[peerId] = _PeerStats()
+            self._peerIds.append(peerId)
+
+    def removePeer(self, peerId):
+        """
+        Stop sending requests to the peer, requests already sent are
+        still waiting for reply (or timeout).
+
+        @param peerId: peer identity
+        """
+        if self.peers.pop(peerId, None) is not None:
+            self._peerIds.remove(peerId)
+
+    def _load(self, stats):
+        """
+        Estimated load of the peer.
+        """
+        if stats.latency is None:
+            # no replies yet from the peer: prefer idle peer to probe it,
+            # otherwise assume it's average
+            latency = self._latency if self._latency is not None else 1.0
+            return latency * stats.outstanding
+        return stats.latency * (stats.outstanding + 1)
+
+    def _selectPeer(self):
+        """
+        Choose peer for the next request.
+
+        @return: peer identity
+        """
+        peerIds = self._peerIds
+        if len(peerIds) == 1:
+            return peerIds[0]
+
+        if self.peerSelection == ZmqPeerSelection.leastLoaded:
+            return min(peerIds, key=lambda peerId: self._load(
+                self.peers[peerId]))
+
+        first, second = self._random.sample(peerIds, 2)
+        if self._load(self.peers[second]) < self._load(self.peers[first]):
+            return second
+        return first
+
+    def sendRequest(self, *messageParts, **kwargs):
+        """
+        Send request to the best peer and deliver reply when available.
+
+        @param messageParts: message data
+        @param timeout: as keyword argument, timeout on request (seconds)
+        @return: Deferred that will fire with list of reply message parts
+        """
+        timeout = kwargs.pop('timeout', self.defaultRequestTimeout)
+        assert len(kwargs) == 0, "Unsupported keyword argument"
 
-    def sendMultipart(self, recipientId, parts):
-        self.send([recipientId] + parts)
+        if not self._peerIds:
+            return defer.fail(ZmqNoPeersError())
+
+        peerId = self._selectPeer()
+        messageId = self._messageIdStruct.pack(self._idPrefix,
+                                               next(self._idCounter))
+        d = defer.Deferred(canceller=lambda _: self._cancel(messageId))
+
+        canceller = None
+        if timeout is not None:
+            canceller = self.factory.reactor.callLater(
+                timeout, self._timeoutRequest, messageId, timeout)
+
+        stats = self.peers[peerId]
+        stats.outstanding += 1
+        stats.requests += 1
+        self._requests[messageId] = (d, peerId, self.factory.reactor.seconds(),
+                                     canceller)
+        self.sendEnvelope((peerId, messageId, b''), messageParts)
+        return d
+
+    def _finishRequest(self, messageId, latency=None):
+        """
+        Forget request, update peer statistics.
+
+        @return: request Deferred or None if request is unknown
+        """
+        d, peerId, sentAt, canceller = self._requests.pop(
+            messageId, (None, None, None, None))
+        if d is None:
+            return None
+
+        if canceller is not None and canceller.active():
+            canceller.cancel()
+
+        stats = self.peers.get(peerId)
+        if stats is not None:
+            stats.outstanding -= 1
+
+        if latency is not None:
+            if stats is not None:
+                stats.latency = self._decay(stats.latency, latency)
+            self._latency = self._decay(self._latency, latency)
+
+        return d
+
+    def _decay(self, average, value):
+        """
+        Update EWMA C{average} with new C{value}.
+        """
+        if average is None:
+            return value
+        return average + self.latencyDecay * (value - average)
+
+    def _cancel(self, messageId):
+        """
+        Cancel outstanding request, drop reply silently.
+        """
+        self._finishRequest(messageId)
+
+    def _timeoutRequest(self, messageId, timeout):
+        """
+        Request timed out, penalize peer.
+        """
+        d = self._finishRequest(messageId, timeout)
+        if d is not None:
+            d.errback(ZmqRequestTimeoutError(messageId))
 
     def messageReceived(self, message):
-        sender_id = message.pop(0)
-        self.gotMessage(sender_id, *message)
+        """
+        Called on incoming message from ZeroMQ.
+
+        @param message: message data
+        """
+        peerId = message[0]
+        if peerId not in self.peers:
+            self.addPeer(peerId)
+
+        if len(message) < 3:
+            # peer announcement
+            return
+
+        messageId = message[1]
+        d, _, sentAt, _ = self._requests.get(messageId,
+                                             (None, None, None, None))
+        if d is None:
+            # reply came for timed out or cancelled request, drop it silently
+            return
+
+        self._finishRequest(messageId,
+                            self.factory.reactor.seconds() - sentAt)
+        d.callback(message[3:])
+
+
+class ZmqWorkerConnection(ZmqDealerConnection):
+    """
+    Worker DEALER connection serving requests of
+    L{ZmqLoadBalancingConnection}.
+
+    Worker announces itself to every peer it connects to (including
+    reconnects), override L{gotMessage} and use L{reply} to send reply.
+    """
+
+    def addEndpoints(self, endpoints):
+        """
+        Connect/bind socket to endpoints, announce worker to peers
+        it connects to.
+        """
+        # socket sends empty message to each peer on connect
+        self.socket.set(constants.PROBE_ROUTER, 1)
+        ZmqDealerConnection.addEndpoints(self, endpoints)
+
+    def reply(self, messageId, *messageParts):
+        """
+        Send reply to request with specified C{messageId}.
+
+        @param messageId: message ID
+        @param messageParts: message data
+        """
+        self.sendEnvelope((messageId, b''), messageParts)
+
+    def messageReceived(self, message):
+        """
+        Called on incoming message from ZeroMQ.
+
+        @param message: message data
+        """
+        self.gotMessage(message[0], *message[2:])
+
+    def gotMessage(self, messageId, *messageParts):
+        """
+        Called on incoming request.
+
+        @param messageId: message ID to reply to
+        @param messageParts: message data
+        """
+        raise NotImplementedError(self)
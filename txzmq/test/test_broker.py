@@ -0,0 +1,137 @@
+"""
+Tests for L{txzmq.broker}.
+"""
+from twisted.internet import defer, reactor
+from twisted.trial import unittest
+
+from txzmq.broker import ZmqBroker, ZmqBrokerWorkerConnection
+from txzmq.connection import ZmqEndpoint, ZmqEndpointType
+from txzmq.factory import ZmqFactory
+from txzmq.req_rep import ZmqREQConnection
+from txzmq.test import _wait
+
+
+class ZmqTestWorkerConnection(ZmqBrokerWorkerConnection):
+    heartbeatInterval = 0.01
+
+    def gotMessage(self, messageId, *messageParts):
+        if not hasattr(self, 'messages'):
+            self.messages = []
+        self.messages.append(messageParts)
+        reactor.callLater(0.01, self.reply, messageId, self.identity,
+                          *messageParts)
+
+
+class ZmqTestBroker(ZmqBroker):
+    heartbeatInterval = 0.01
+
+
+class ZmqBrokerTestCase(unittest.TestCase):
+    """
+    Test case for L{txzmq.broker.ZmqBroker}.
+    """
+
+    def setUp(self):
+        self.factory = ZmqFactory()
+        self.broker = ZmqTestBroker(
+            self.factory,
+            ZmqEndpoint(ZmqEndpointType.bind, "ipc://#9"),
+            ZmqEndpoint(ZmqEndpointType.bind, "ipc://#10"))
+        self.client = ZmqREQConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "ipc://#9"))
+
+    def tearDown(self):
+        self.factory.shutdown()
+
+    def _worker(self, identity):
+        return ZmqTestWorkerConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "ipc://#10"),
+            identity=identity)
+
+    def test_load_balancing(self):
+        workers = [self._worker(b'worker%d' % i) for i in range(2)]
+
+        def send(_):
+            return defer.DeferredList(
+                [self.client.sendMsg(b'req%d' % i) for i in range(4)],
+                fireOnOneErrback=True)
+
+        def check(results):
+            replies = [reply for _, reply in results]
+            self.failUnlessEqual([b'req%d' % i for i in range(4)],
+                                 [reply[1] for reply in replies])
+            self.failUnlessEqual(2, len(workers[0].messages))
+            self.failUnlessEqual(2, len(workers[1].messages))
+            self.failUnlessEqual(set([b'worker0', b'worker1']),
+                                 set(self.broker.ready))
+            self.failUnlessEqual(0, len(self.broker.requests))
+            self.failUnlessEqual([0, 0], [worker.brokerReconnects
+                                          for worker in workers])
+
+        return _wait(0.05).addCallback(send).addCallback(check)
+
+    def test_queue_requests(self):
+        d = self.client.sendMsg(b'req')
+
+        def check_queued(_):
+            self.failUnlessEqual(1, len(self.broker.requests))
+            self._worker(b'worker')
+            return d
+
+        return _wait(0.02).addCallback(check_queued).addCallback(
+            lambda reply: self.failUnlessEqual([b'worker', b'req'], reply))
+
+    def test_max_queued_requests(self):
+        self.broker.maxQueuedRequests = 1
+        self.client.sendMsg(b'req1')
+        self.client.sendMsg(b'req2')
+
+        def check(_):
+            self.failUnlessEqual(1, len(self.broker.requests))
+            self.failUnlessEqual(1, self.broker.requestsDropped)
+
+        return _wait(0.02).addCallback(check)
+
+    def test_heartbeat_expiry(self):
+        worker = self._worker(b'worker')
+
+        def check_alive(_):
+            self.failUnlessEqual([b'worker'], list(self.broker.workers))
+            self.failUnlessEqual([b'worker'], list(self.broker.ready))
+
+            worker.shutdown()
+            self.broker.workers[b'ghost'] = 0
+            self.broker.ready[b'ghost'] = None
+            return _wait(0.05)
+
+        def check_expired(_):
+            self.failUnlessEqual({}, self.broker.workers)
+            self.failUnlessEqual(0, len(self.broker.ready))
+            self.failUnlessEqual(1, self.broker.workersExpired)
+
+        return _wait(0.05).addCallback(check_alive).addCallback(check_expired)
+
+    def test_broker_expiry(self):
+        worker = ZmqTestWorkerConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "ipc://#10"),
+            identity=b'worker')
+
+        def check_alive(_):
+            self.failUnlessEqual(0, worker.brokerReconnects)
+            self.broker.shutdown()
+            return _wait(0.1)
+
+        def check_reconnected(_):
+            self.failIfEqual(0, worker.brokerReconnects)
+
+            self.broker = ZmqTestBroker(
+                self.factory,
+                ZmqEndpoint(ZmqEndpointType.bind, "ipc://#9"),
+                ZmqEndpoint(ZmqEndpointType.bind, "ipc://#10"))
+            return _wait(0.1)
+
+        def check_registered(_):
+            self.failUnlessEqual([b'worker'], list(self.broker.ready))
+
+        return _wait(0.05).addCallback(check_alive) \
+            .addCallback(check_reconnected).addCallback(check_registered)
@@ -1,14 +1,18 @@
 """
 Tests for L{txzmq.connection}.
 """
-from zmq import constants
+from zmq import constants, error, Frame
 
 from zope.interface import verify as ziv
 
-from twisted.internet.interfaces import IFileDescriptor, IReadDescriptor
+from twisted.internet import defer
+from twisted.internet.error import ConnectionDone
+from twisted.internet.interfaces import IConsumer, IFileDescriptor, \
+    IPushProducer, IReadDescriptor
 from twisted.trial import unittest
 
-from txzmq.connection import ZmqConnection, ZmqEndpoint, ZmqEndpointType
+from txzmq.connection import ZmqConnection, ZmqEndpoint, ZmqEndpointType, \
+    ZmqQueueOverflowError, ZmqQueueOverflowPolicy
 from txzmq.factory import ZmqFactory
 from txzmq.test import _wait
 
@@ -17,6 +21,11 @@ class ZmqTestSender(ZmqConnection):
     socketType = constants.PUSH
 
 
+class ZmqTestQueueSender(ZmqTestSender):
+    queueOutgoing = True
+    queueMaxMessages = 3
+
+
 class ZmqTestReceiver(ZmqConnection):
     socketType = constants.PULL
 
@@ -27,6 +36,58 @@ class ZmqTestReceiver(ZmqConnection):
         self.messages.append(message)
 
 
+class ZmqTestZeroCopyReceiver(ZmqTestReceiver):
+    recvCopy = False
+    recvCopyThreshold = 1000
+
+
+class ZmqTestBudgetReceiver(ZmqTestReceiver):
+    maxMessagesPerRead = 10
+
+
+class ZmqTestBatchReceiver(ZmqTestReceiver):
+    messageBatchSize = 16
+
+    def messagesReceived(self, messages):
+        if not hasattr(self, 'batches'):
+            self.batches = []
+
+        self.batches.append(len(messages))
+        ZmqTestReceiver.messagesReceived(self, messages)
+
+
+class FakeProducer(object):
+    paused = False
+    stopped = False
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+
+    def stopProducing(self):
+        self.stopped = True
+
+
+class FakePullProducer(object):
+    stopped = False
+
+    def __init__(self, consumer, count):
+        self.consumer = consumer
+        self.count = count
+        self.resumed = 0
+
+    def resumeProducing(self):
+        self.resumed += 1
+        if self.count:
+            self.count -= 1
+            self.consumer.write(b'data')
+
+    def stopProducing(self):
+        self.stopped = True
+
+
 class ZmqConnectionTestCase(unittest.TestCase):
     """
     Test case for L{zmq.twisted.connection.Connection}.
@@ -41,6 +102,8 @@ class ZmqConnectionTestCase(unittest.TestCase):
     def test_interfaces(self):
         ziv.verifyClass(IReadDescriptor, ZmqConnection)
         ziv.verifyClass(IFileDescriptor, ZmqConnection)
+        ziv.verifyClass(IConsumer, ZmqConnection)
+        ziv.verifyClass(IPushProducer, ZmqConnection)
 
     def test_init(self):
         ZmqTestReceiver(
@@ -126,3 +189,335 @@ class ZmqConnectionTestCase(unittest.TestCase):
                 result, expected, "Messages should have been received")
 
         return _wait(0.01).addCallback(check)
+
+    def test_send_recv_zero_copy(self):
+        r = ZmqTestZeroCopyReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1"))
+
+        s.send([b'small', b'0' * 10000])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            self.failUnlessEqual(1, len(result))
+            small, large = result[0]
+            self.failUnlessEqual(b'small', small)
+            self.failUnlessIsInstance(large, Frame)
+            self.failUnlessEqual(b'0' * 10000, large.bytes)
+
+        return _wait(0.01).addCallback(check)
+
+    def test_send_recv_buffers(self):
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1"))
+
+        s.send(bytearray(b'abcd'), copy=False)
+        s.send([memoryview(b'efgh'), bytearray(b'ijkl')], copy=False)
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'abcd'], [b'efgh', b'ijkl']]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+
+        return _wait(0.01).addCallback(check)
+
+    def test_send_track(self):
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind,
+                                      "tcp://127.0.0.1:5555"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "tcp://127.0.0.1:5555"))
+
+        payload = bytearray(b'0' * 100000)
+        d = s.send([b'head', payload], track=True)
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'head', b'0' * 100000]]
+            self.failUnlessEqual(
+                result, expected, "Message should have been received")
+            self.failUnlessEqual([], s.trackers)
+
+        return d.addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_read_budget(self):
+        r = ZmqTestBudgetReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1"))
+
+        for i in range(100):
+            s.send(str(i).encode())
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[str(i).encode()] for i in range(100)]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+            self.failUnless(r.readBudgetHits > 0)
+
+        return _wait(0.01).addCallback(check)
+
+    def test_batch_receive(self):
+        r = ZmqTestBatchReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1"))
+
+        for i in range(100):
+            s.send(str(i).encode())
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[str(i).encode()] for i in range(100)]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+            self.failUnlessEqual(100, sum(r.batches))
+            self.failUnless(max(r.batches) <= 16)
+            self.failUnless(len(r.batches) < 100)
+
+        return _wait(0.01).addCallback(check)
+
+    def test_send_queue(self):
+        s = ZmqTestQueueSender(self.factory)
+        s.queueMaxMessages = 0
+
+        for i in range(10):
+            s.send(str(i).encode())
+
+        self.failUnlessEqual(10, len(s.queue))
+        self.failUnlessEqual(10, s.queueBytes)
+
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind,
+                                      "tcp://127.0.0.1:5555"))
+        s.addEndpoints([ZmqEndpoint(ZmqEndpointType.connect,
+                                    "tcp://127.0.0.1:5555")])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[str(i).encode()] for i in range(10)]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+            self.failUnlessEqual(0, len(s.queue))
+            self.failUnlessEqual(0, s.queueBytes)
+
+        return _wait(0.1).addCallback(check)
+
+    def test_send_queue_buffers(self):
+        s = ZmqTestQueueSender(self.factory)
+        s.queueMaxMessages = 0
+
+        s.send([b'abc', bytearray(b'de'), memoryview(b'fgh')[1:],
+                Frame(b'ijkl')])
+
+        self.failUnlessEqual(1, len(s.queue))
+        self.failUnlessEqual(11, s.queueBytes)
+
+    def test_send_queue_overflow_raise(self):
+        s = ZmqTestQueueSender(self.factory)
+
+        for i in range(3):
+            s.send(str(i).encode())
+
+        self.failUnlessRaises(ZmqQueueOverflowError, s.send, b'3')
+        self.failUnlessEqual(3, len(s.queue))
+
+    def test_send_queue_overflow_drop_oldest(self):
+        s = ZmqTestQueueSender(self.factory)
+        s.queueOverflowPolicy = ZmqQueueOverflowPolicy.dropOldest
+
+        for i in range(5):
+            s.send(str(i).encode())
+
+        self.failUnlessEqual([[b'2'], [b'3'], [b'4']],
+                             [entry[0] for entry in s.queue])
+        self.failUnlessEqual(2, s.queueDropped)
+
+    def test_send_queue_overflow_drop_newest(self):
+        s = ZmqTestQueueSender(self.factory)
+        s.queueOverflowPolicy = ZmqQueueOverflowPolicy.dropNewest
+        s.queueMaxMessages = 0
+        s.queueMaxBytes = 4
+
+        for i in range(5):
+            s.send(b'ab')
+
+        self.failUnlessEqual(2, len(s.queue))
+        self.failUnlessEqual(4, s.queueBytes)
+        self.failUnlessEqual(3, s.queueDropped)
+
+    def test_pause_resume_reading(self):
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1"))
+
+        r.pauseProducing()
+        s.send(b'abcd')
+
+        def check_paused(ignore):
+            self.failIf(hasattr(r, 'messages'))
+            r.resumeProducing()
+
+        def check(ignore):
+            self.failUnlessEqual([[b'abcd']], r.messages)
+
+        return _wait(0.01).addCallback(check_paused) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_producer(self):
+        s = ZmqTestQueueSender(self.factory)
+        s.queueMaxMessages = 0
+        producer = FakeProducer()
+        s.registerProducer(producer, True)
+
+        s.write(b'abcd')
+        self.failUnless(producer.paused)
+
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s.addEndpoints([ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1")])
+
+        def check(ignore):
+            self.failUnlessEqual([[b'abcd']], r.messages)
+            self.failIf(producer.paused)
+            s.shutdown()
+            self.failUnless(producer.stopped)
+
+        return _wait(0.01).addCallback(check)
+
+    def test_pull_producer(self):
+        s = ZmqTestQueueSender(self.factory)
+        s.queueMaxMessages = 0
+        producer = FakePullProducer(s, 3)
+        s.registerProducer(producer, False)
+
+        # message is queued, producer is waiting for the queue to flush
+        self.failUnlessEqual(1, producer.resumed)
+        self.failUnlessEqual(1, len(s.queue))
+
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s.addEndpoints([ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1")])
+
+        def check(ignore):
+            self.failUnlessEqual([[b'data']] * 3, r.messages)
+            # asked for more data once per write, not per read
+            self.failUnlessEqual(4, producer.resumed)
+
+            # reads caused by socket events don't ask for more data
+            for i in range(3):
+                s.doRead()
+            self.failUnlessEqual(4, producer.resumed)
+
+        return _wait(0.01).addCallback(check)
+
+    def test_send_deferred(self):
+        s = ZmqTestQueueSender(self.factory)
+
+        d1 = s.sendDeferred(b'abcd')
+        self.failIf(d1.called)
+
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s.addEndpoints([ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1")])
+
+        def check(ignore):
+            self.failUnlessEqual([[b'abcd'], [b'ef', b'gh']], r.messages)
+
+        return d1.addCallback(lambda _: s.sendDeferred([b'ef', b'gh'])) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_send_deferred_overflow(self):
+        s = ZmqTestQueueSender(self.factory)
+
+        ds = [s.sendDeferred(b'abcd') for _ in range(4)]
+        self.failUnlessFailure(ds[3], ZmqQueueOverflowError)
+
+        s.shutdown()
+        for d in ds[:3]:
+            self.failUnlessFailure(d, ConnectionDone)
+
+        return defer.DeferredList(ds, fireOnOneErrback=True)
+
+    def test_send_deferred_no_queue(self):
+        s = ZmqTestSender(self.factory)
+
+        return self.failUnlessFailure(s.sendDeferred(b'abcd'), error.Again)
+
+    def test_send_many(self):
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1"))
+
+        s.sendMany([b'abcd', [b'ef', b'gh'], bytearray(b'ijkl')])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'abcd'], [b'ef', b'gh'], [b'ijkl']]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+
+        return _wait(0.01).addCallback(check)
+
+    def test_send_envelope(self):
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s = ZmqTestSender(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1"))
+
+        s.sendEnvelope((b'id', b''), (b'abcd', b'ef'))
+        s.sendEnvelope([b'id', b''], [])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'id', b'', b'abcd', b'ef'], [b'id', b'']]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+
+        return _wait(0.01).addCallback(check)
+
+    def test_send_envelope_queue(self):
+        s = ZmqTestQueueSender(self.factory)
+
+        s.sendEnvelope((b'id', b''), (b'abcd',))
+        s.sendEnvelope((b'id', b''), (b'ef',))
+        self.failUnlessEqual(2, len(s.queue))
+
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s.addEndpoints([ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1")])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'id', b'', b'abcd'], [b'id', b'', b'ef']]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+
+        return _wait(0.01).addCallback(check)
+
+    def test_send_many_queue(self):
+        s = ZmqTestQueueSender(self.factory)
+        s.queueMaxMessages = 0
+
+        s.sendMany([str(i).encode() for i in range(10)])
+        self.failUnlessEqual(10, len(s.queue))
+
+        r = ZmqTestReceiver(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://#1"))
+        s.addEndpoints([ZmqEndpoint(ZmqEndpointType.connect, "inproc://#1")])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[str(i).encode()] for i in range(10)]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+
+        return _wait(0.01).addCallback(check)
@@ -1,11 +1,19 @@
 """
 Tests for L{txzmq.factory}.
 """
+from twisted.internet.task import Clock
 from twisted.trial import unittest
 
 from txzmq.factory import ZmqFactory
 
 
+class FakeConnection(object):
+    reads = 0
+
+    def doRead(self):
+        self.reads += 1
+
+
 class ZmqFactoryTestCase(unittest.TestCase):
     """
     Test case for L{zmq.twisted.factory.Factory}.
@@ -16,3 +24,21 @@ class ZmqFactoryTestCase(unittest.TestCase):
 
     def test_shutdown(self):
         self.factory.shutdown()
+
+    def test_scheduleRead(self):
+        clock = Clock()
+        self.factory.reactor = clock
+
+        connections = [FakeConnection() for _ in range(10)]
+        for _ in range(100):
+            for connection in connections:
+                self.factory.scheduleRead(connection)
+
+        self.failUnlessEqual(1, len(clock.getDelayedCalls()))
+        clock.advance(0)
+
+        self.failUnlessEqual([1] * 10, [c.reads for c in connections])
+        self.failUnlessEqual(0, len(clock.getDelayedCalls()))
+        self.failUnlessEqual(set(), self.factory.pendingReads)
+
+        self.factory.shutdown()
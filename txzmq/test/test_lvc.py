@@ -0,0 +1,86 @@
+"""
+Tests for L{txzmq.lvc}.
+"""
+from twisted.trial import unittest
+
+from txzmq.connection import ZmqEndpoint, ZmqEndpointType
+from txzmq.factory import ZmqFactory
+from txzmq.lvc import ZmqLastValueCache
+from txzmq.pubsub import ZmqPubConnection, ZmqSubConnection
+from txzmq.test import _wait
+
+
+class ZmqTestSubConnection(ZmqSubConnection):
+    def gotMessage(self, message, tag):
+        if not hasattr(self, 'messages'):
+            self.messages = []
+
+        self.messages.append([tag, message])
+
+
+class ZmqLastValueCacheTestCase(unittest.TestCase):
+    """
+    Test case for L{txzmq.lvc.ZmqLastValueCache}.
+    """
+
+    def setUp(self):
+        self.factory = ZmqFactory()
+        self.lvc = ZmqLastValueCache(
+            self.factory,
+            ZmqEndpoint(ZmqEndpointType.bind, "inproc://lvc-frontend"),
+            ZmqEndpoint(ZmqEndpointType.bind, "inproc://lvc-backend"))
+
+    def tearDown(self):
+        self.factory.shutdown()
+
+    def test_replay(self):
+        pub = ZmqPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://lvc-frontend"))
+
+        def publish(ignore):
+            pub.publish(b'1', b'tag1')
+            pub.publish(b'2', b'tag1')
+            pub.publish(b'3', b'tag2')
+            pub.publish(b'4', b'other')
+
+        def subscribe(ignore):
+            self.failUnlessEqual([b'tag1', b'tag2', b'other'],
+                                 list(self.lvc.cache))
+            self.sub = ZmqTestSubConnection(
+                self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                          "inproc://lvc-backend"))
+            self.sub.subscribe(b'tag')
+            return _wait(0.05)
+
+        def check(ignore):
+            self.failUnlessEqual([[b'tag1', b'2'], [b'tag2', b'3']],
+                                 self.sub.messages)
+            self.failUnlessEqual(2, self.lvc.replayedCount)
+
+            pub.publish(b'5', b'tag2')
+            return _wait(0.05)
+
+        def check_forwarded(ignore):
+            self.failUnlessEqual([b'tag2', b'5'], self.sub.messages[-1])
+
+        return _wait(0.05).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.05)).addCallback(subscribe) \
+            .addCallback(check).addCallback(check_forwarded)
+
+    def test_lru_bounds(self):
+        self.lvc.maxEntries = 2
+        self.lvc.maxBytes = 10
+
+        self.lvc._gotMessage(b'a', [b'a\0' + b'1'])
+        self.lvc._gotMessage(b'b', [b'b\0' + b'2'])
+        self.lvc._gotMessage(b'a', [b'a\0' + b'3'])
+        self.lvc._gotMessage(b'c', [b'c\0' + b'4'])
+        self.failUnlessEqual([b'a', b'c'], list(self.lvc.cache))
+        self.failUnlessEqual(6, self.lvc.cacheBytes)
+        self.failUnlessEqual(1, self.lvc.evictedCount)
+
+        self.lvc._gotMessage(b'd', [b'd', b'x' * 8])
+        self.failUnlessEqual([b'd'], list(self.lvc.cache))
+        self.failUnlessEqual(9, self.lvc.cacheBytes)
+        self.failUnlessEqual(3, self.lvc.evictedCount)
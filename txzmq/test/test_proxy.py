@@ -0,0 +1,85 @@
+"""
+Tests for L{txzmq.proxy}.
+"""
+from zmq import constants
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from txzmq.connection import ZmqEndpoint, ZmqEndpointType
+from txzmq.factory import ZmqFactory
+from txzmq.pushpull import ZmqPushConnection, ZmqPullConnection
+from txzmq.test import _wait
+
+
+class ZmqTestPullConnection(ZmqPullConnection):
+    def onPull(self, message):
+        if not hasattr(self, 'messages'):
+            self.messages = []
+        self.messages.append(message)
+
+
+class ZmqProxyTestCase(unittest.TestCase):
+    """
+    Test case for L{txzmq.proxy.ZmqProxy}.
+    """
+
+    def setUp(self):
+        self.factory = ZmqFactory()
+        self.proxy = self.factory.proxy(
+            constants.PULL, [ZmqEndpoint(ZmqEndpointType.bind, "ipc://#11")],
+            constants.PUSH, [ZmqEndpoint(ZmqEndpointType.bind, "ipc://#12")],
+            ZmqEndpoint(ZmqEndpointType.bind, "inproc://capture"))
+        self.pusher = ZmqPushConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "ipc://#11"))
+        self.puller = ZmqTestPullConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "ipc://#12"))
+
+    def tearDown(self):
+        self.factory.shutdown()
+
+    def test_forward(self):
+        self.pusher.push([b'abc', b'def'])
+
+        def check(_):
+            self.failUnlessEqual([[b'abc', b'def']], self.puller.messages)
+            return self.proxy.statistics()
+
+        def check_statistics(statistics):
+            self.failUnlessEqual(2, statistics['frontendMessagesIn'])
+            self.failUnlessEqual(6, statistics['frontendBytesIn'])
+            self.failUnlessEqual(2, statistics['backendMessagesOut'])
+            self.failUnlessEqual(0, statistics['backendMessagesIn'])
+
+        return self.proxy.started.addCallback(lambda _: _wait(0.05)) \
+            .addCallback(check).addCallback(check_statistics)
+
+    @defer.inlineCallbacks
+    def test_pause_resume(self):
+        yield self.proxy.pause()
+        self.failUnless(self.proxy.paused)
+        self.pusher.push(b'abc')
+
+        yield _wait(0.05)
+        self.failIf(hasattr(self.puller, 'messages'))
+        statistics = yield self.proxy.statistics()
+        self.failUnlessEqual(0, statistics['frontendMessagesIn'])
+
+        self.proxy.resume()
+        for _ in range(100):
+            yield _wait(0.01)
+            if hasattr(self.puller, 'messages'):
+                break
+
+        statistics = yield self.proxy.statistics()
+        self.failUnlessEqual([[b'abc']], self.puller.messages)
+        self.failUnlessEqual(1, statistics['frontendMessagesIn'])
+        self.failUnlessEqual([], list(self.proxy.control.statistics))
+
+    def test_terminate(self):
+        def check(proxy):
+            self.failUnless(proxy is self.proxy)
+            self.failUnless(all(socket.closed for socket in proxy.sockets))
+            self.failIf(proxy.control in self.factory.connections)
+
+        return self.proxy.terminate().addCallback(check)
@@ -5,7 +5,8 @@ from twisted.trial import unittest
 
 from txzmq.connection import ZmqEndpoint, ZmqEndpointType
 from txzmq.factory import ZmqFactory
-from txzmq.pubsub import ZmqPubConnection, ZmqSubConnection
+from txzmq.pubsub import ZmqPubConnection, ZmqSubConnection, \
+    ZmqXPubConnection, ZmqXSubConnection
 from txzmq.test import _wait
 
 from zmq.error import ZMQError
@@ -19,6 +20,51 @@ class ZmqTestSubConnection(ZmqSubConnection):
         self.messages.append([tag, message])
 
 
+class ZmqTestBatchSubConnection(ZmqTestSubConnection):
+    messageBatchSize = 10
+
+    def gotMessages(self, messages):
+        if not hasattr(self, 'batches'):
+            self.batches = []
+
+        self.batches.append(messages)
+        ZmqTestSubConnection.gotMessages(self, messages)
+
+
+class ZmqTestConflatingSubConnection(ZmqTestSubConnection):
+    conflateTopics = True
+    conflateInterval = 0.05
+
+
+class ZmqTestConflatingSocketSubConnection(ZmqTestSubConnection):
+    conflate = True
+
+
+class ZmqTestXSubConnection(ZmqXSubConnection, ZmqTestSubConnection):
+    pass
+
+
+class ZmqTestXPubConnection(ZmqXPubConnection):
+    def gotSubscription(self, tag):
+        self.events.append((b'sub', tag))
+
+    def gotUnsubscription(self, tag):
+        self.events.append((b'unsub', tag))
+
+    def __init__(self, *args, **kwargs):
+        self.events = []
+        ZmqXPubConnection.__init__(self, *args, **kwargs)
+
+
+class ZmqTestZeroCopySubConnection(ZmqTestSubConnection):
+    recvCopy = False
+    recvCopyThreshold = 100
+
+
+class ZmqMultipartPubConnection(ZmqPubConnection):
+    multipartTopic = True
+
+
 def _detect_epgm():
     """
     Utility function to test for presence of epgm:// in zeromq.
@@ -131,5 +177,210 @@ class ZmqConnectionTestCase(unittest.TestCase):
         return _wait(0.1).addCallback(publish) \
             .addCallback(lambda _: _wait(0.1)).addCallback(check)
 
+    def test_publish_many(self):
+        r = ZmqTestSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://many"))
+        s = ZmqPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://many"))
+
+        r.subscribe(b'tag')
+
+        def publish(ignore):
+            s.publishMany([(b'xyz', b'different-tag'), (b'abcd', b'tag1'),
+                           (b'efgh', b'tag2')])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'tag1', b'abcd'], [b'tag2', b'efgh']]
+            self.failUnlessEqual(
+                result, expected, "Message should have been received")
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_multipart_topic(self):
+        r = ZmqTestSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind,
+                                      "inproc://multipart"))
+        s = ZmqMultipartPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://multipart"))
+
+        r.subscribe(b'tag')
+        payload = b'x' * 100000
+
+        def publish(ignore):
+            s.publish(payload, b'tag0')
+            s.publish(b'abcd', b'different-tag')
+            s.publishMany([(b'ef\0gh', b'tag1'), (b'ijkl', b'tag2')])
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'tag0', payload], [b'tag1', b'ef\0gh'],
+                        [b'tag2', b'ijkl']]
+            self.failUnlessEqual(
+                result, expected, "Message should have been received")
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_zero_copy(self):
+        r = ZmqTestZeroCopySubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind,
+                                      "inproc://zero-copy"))
+        s = ZmqPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://zero-copy"))
+        m = ZmqMultipartPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://zero-copy"))
+
+        r.subscribe(b'tag')
+        payload = b'x' * 1000
+
+        def publish(ignore):
+            s.publish(payload, b'tag0')
+            m.publish(payload, b'tag1' * 100)
+
+        def check(ignore):
+            result = [[tag, bytes(message)] for tag, message in
+                      getattr(r, 'messages', [])]
+            expected = [[b'tag0', payload], [b'tag1' * 100, payload]]
+            self.failUnlessEqual(
+                result, expected, "Message should have been received")
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_conflate_topics(self):
+        r = ZmqTestConflatingSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind,
+                                      "inproc://conflate"))
+        s = ZmqPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://conflate"))
+
+        r.subscribe(b'tag')
+
+        def publish(ignore):
+            for i in range(10):
+                s.publish(str(i).encode(), b'tag1')
+                s.publish(str(i).encode(), b'tag2')
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'tag1', b'9'], [b'tag2', b'9']]
+            self.failUnlessEqual(
+                result, expected, "Message should have been received")
+            self.failUnlessEqual(18, r.conflatedCount)
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.1)).addCallback(check)
+
+    def test_conflate_socket(self):
+        r = ZmqTestConflatingSocketSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind,
+                                      "ipc://conflate"))
+        s = ZmqPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "ipc://conflate"))
+
+        r.subscribe(b'tag')
+
+        def publish(ignore):
+            for i in range(10):
+                s.publish(str(i).encode(), b'tag')
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            self.failUnlessEqual([b'tag', b'9'], result[-1])
+            self.failUnless(len(result) < 10)
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_xpub_xsub(self):
+        r = ZmqTestXSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://xpub"))
+        s = ZmqTestXPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://xpub"))
+
+        r.subscribe(b'tag')
+
+        def publish(ignore):
+            self.failUnlessEqual([(b'sub', b'tag')], s.events)
+            s.publish(b'abcd', b'tag1')
+            s.publish(b'efgh', b'other')
+            r.unsubscribe(b'tag')
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            self.failUnlessEqual([[b'tag1', b'abcd']], result)
+            self.failUnlessEqual([(b'sub', b'tag'), (b'unsub', b'tag')],
+                                 s.events)
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_send_recv_batch(self):
+        r = ZmqTestBatchSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://batch"))
+        s = ZmqPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://batch"))
+
+        r.subscribe(b'tag')
+
+        def publish(ignore):
+            for i in range(25):
+                s.publish(str(i).encode(), b'tag')
+
+        def check(ignore):
+            result = getattr(r, 'messages', [])
+            expected = [[b'tag', str(i).encode()] for i in range(25)]
+            self.failUnlessEqual(
+                result, expected, "Messages should have been received")
+            self.failUnlessEqual((b'0', b'tag'), r.batches[0][0])
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
+    def test_subscribe_handlers(self):
+        r = ZmqTestSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind,
+                                      "inproc://handlers"))
+        s = ZmqPubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://handlers"))
+        received = []
+
+        def handler(message, tag):
+            received.append((b'a', tag, message))
+
+        def handler2(message, tag):
+            received.append((b'ab', tag, message))
+
+        r.subscribe(b'a', handler)
+        r.subscribe(b'ab', handler2)
+        r.subscribe(b'b')
+
+        def publish(ignore):
+            s.publish(b'1', b'abc')
+            s.publish(b'2', b'ac')
+            s.publish(b'3', b'b')
+
+        def check(ignore):
+            self.failUnlessEqual([(b'a', b'abc', b'1'), (b'ab', b'abc', b'1'),
+                                  (b'a', b'ac', b'2')], received)
+            self.failUnlessEqual([[b'b', b'3']], r.messages)
+
+            r.unsubscribe(b'ab', handler2)
+            self.failUnlessEqual([handler], r.handlers.match(b'abc'))
+
+        return _wait(0.01).addCallback(publish) \
+            .addCallback(lambda _: _wait(0.01)).addCallback(check)
+
     if not _detect_epgm():
         test_send_recv_pgm.skip = "epgm:// not available"
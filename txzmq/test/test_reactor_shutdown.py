@@ -1,6 +1,9 @@
 """
 Tests for L{txzmq.factory} automatic shutdown.
 """
+from zmq import constants
+
+from txzmq.connection import ZmqEndpoint, ZmqEndpointType
 from txzmq.factory import ZmqFactory
 
 from twisted.internet.test.reactormixins import ReactorBuilder
@@ -38,5 +41,24 @@ class ZmqReactorShutdownTestCase(ReactorBuilder):
         reactor.callWhenRunning(_test)
         reactor.run()
 
+    def test_reactor_shutdown_proxy(self):
+        reactor = self.buildReactor()
+
+        def _test():
+            factory = ZmqFactory()
+            factory.reactor = reactor
+            factory.registerForShutdown()
+            self.proxy = factory.proxy(
+                constants.PULL,
+                [ZmqEndpoint(ZmqEndpointType.bind, "inproc://shutdown-in")],
+                constants.PUSH,
+                [ZmqEndpoint(ZmqEndpointType.bind, "inproc://shutdown-out")])
+            reactor.stop()
+        reactor.callWhenRunning(_test)
+        reactor.run()
+
+        self.failUnless(self.proxy.stopped.called)
+        self.failUnless(all(socket.closed for socket in self.proxy.sockets))
+
 
 globals().update(ZmqReactorShutdownTestCase.makeTestCaseClasses())
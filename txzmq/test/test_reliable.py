@@ -0,0 +1,118 @@
+"""
+Tests for L{txzmq.reliable}.
+"""
+from twisted.trial import unittest
+
+from txzmq.connection import ZmqEndpoint, ZmqEndpointType
+from txzmq.factory import ZmqFactory
+from txzmq.reliable import ZmqReliablePubConnection, \
+    ZmqReliableSubConnection
+from txzmq.test import _wait
+
+
+class ZmqTestReliableSubConnection(ZmqReliableSubConnection):
+    def gotMessage(self, message, tag):
+        if not hasattr(self, 'messages'):
+            self.messages = []
+
+        self.messages.append([tag, message])
+
+    def gotGap(self, tag, expected, received):
+        if not hasattr(self, 'gaps'):
+            self.gaps = []
+
+        self.gaps.append((tag, expected, received))
+
+
+class ZmqReliableTestCase(unittest.TestCase):
+    """
+    Test case for L{txzmq.reliable}.
+    """
+
+    def setUp(self):
+        self.factory = ZmqFactory()
+
+    def tearDown(self):
+        self.factory.shutdown()
+
+    def test_gap_detection(self):
+        pub = ZmqReliablePubConnection(self.factory)
+        sub = ZmqTestReliableSubConnection(self.factory)
+
+        sub.messageReceived(pub._frame(b'a', b'tag'))
+        pub._frame(b'b', b'tag')
+        third = pub._frame(b'c', b'tag')
+        sub.messageReceived(third)
+        sub.messageReceived(third)
+        sub.messageReceived(pub._frame(b'x', b'other'))
+
+        self.failUnlessEqual([[b'tag', b'a'], [b'tag', b'c'],
+                              [b'other', b'x']], sub.messages)
+        self.failUnlessEqual([(b'tag', 2, 3)], sub.gaps)
+        self.failUnlessEqual(1, sub.gapCount)
+        self.failUnlessEqual(1, sub.missedCount)
+
+        # publisher restart isn't a gap
+        restarted = ZmqReliablePubConnection(self.factory)
+        sub.messageReceived(restarted._frame(b'd', b'tag'))
+        self.failUnlessEqual([b'tag', b'd'], sub.messages[-1])
+        self.failUnlessEqual(1, sub.gapCount)
+
+    def test_snapshot_recovery(self):
+        pub = ZmqReliablePubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "inproc://rpub"),
+            snapshotEndpoint=ZmqEndpoint(ZmqEndpointType.bind,
+                                         "inproc://rpub-snapshot"))
+        pub.publish(b'initial', b'tag1')
+        pub.publish(b'ignored', b'other')
+
+        sub = ZmqTestReliableSubConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect,
+                                      "inproc://rpub"),
+            snapshotEndpoint=ZmqEndpoint(ZmqEndpointType.connect,
+                                         "inproc://rpub-snapshot"))
+        sub.subscribe(b'tag')
+
+        def publish(ignore):
+            self.failUnlessEqual([[b'tag1', b'initial']], sub.messages)
+            pub.publish(b'a', b'tag1')
+            # lost message
+            pub._frame(b'b', b'tag1')
+            pub.publish(b'c', b'tag2')
+            pub.publish(b'd', b'tag1')
+            pub.publish(b'e', b'tag1')
+            return _wait(0.05)
+
+        def check(ignore):
+            # snapshot has the latest message, 'd' is skipped
+            self.failUnlessEqual([[b'tag1', b'initial'], [b'tag1', b'a'],
+                                  [b'tag2', b'c'], [b'tag1', b'e']],
+                                 sub.messages)
+            self.failUnlessEqual(1, sub.gapCount)
+            self.failUnlessEqual(1, sub.missedCount)
+            self.failUnlessEqual(1, sub.recoveryCount)
+            self.failUnless(sub.recoveryLatency > 0)
+            self.failUnlessEqual(sub.recoveryLatency, sub.recoveryLatencyMax)
+
+        return _wait(0.05).addCallback(publish).addCallback(check)
+
+    def test_snapshot_timeout(self):
+        pub = ZmqReliablePubConnection(self.factory)
+        sub = ZmqTestReliableSubConnection(
+            self.factory, snapshotEndpoint=ZmqEndpoint(
+                ZmqEndpointType.connect, "inproc://rpub-nowhere"))
+        sub.snapshotTimeout = 0.05
+
+        sub.messageReceived(pub._frame(b'a', b'tag'))
+        pub._frame(b'b', b'tag')
+        sub.messageReceived(pub._frame(b'c', b'tag'))
+        sub.messageReceived(pub._frame(b'd', b'tag'))
+        self.failUnlessEqual([[b'tag', b'a']], sub.messages)
+
+        def check(ignore):
+            self.failUnlessEqual([[b'tag', b'a'], [b'tag', b'c'],
+                                  [b'tag', b'd']], sub.messages)
+            self.failUnlessEqual(1, sub.recoveryFailedCount)
+            self.failUnlessEqual(0, sub.recoveryCount)
+
+        return _wait(0.1).addCallback(check)
@@ -1,15 +1,20 @@
 """
 Tests for L{txzmq.req_rep}.
 """
+import threading
+
 from twisted.internet import defer, reactor
+from twisted.python.threadpool import ThreadPool
 from twisted.trial import unittest
 
 from txzmq.connection import ZmqEndpoint, ZmqEndpointType
 from txzmq.factory import ZmqFactory
 from txzmq.test import _wait
 from txzmq.req_rep import ZmqREPConnection, ZmqREQConnection, \
-    ZmqRequestTimeoutError
+    ZmqRequestTimeoutError, ZmqUnknownRequestError, unpackMessageId, \
+    _packBatch, _unpackBatch
 from txzmq.compat import binary_string_type
+from txzmq.timerwheel import TimerWheel
 
 
 class ZmqTestREPConnection(ZmqREPConnection):
@@ -20,11 +25,88 @@ class ZmqTestREPConnection(ZmqREPConnection):
         self.reply(messageId, *messageParts)
 
 
+class ZmqSilentREPConnection(ZmqREPConnection):
+    def gotMessage(self, messageId, *messageParts):
+        pass
+
+
 class ZmqSlowREPConnection(ZmqREPConnection):
     def gotMessage(self, messageId, *messageParts):
+        if not hasattr(self, 'messages'):
+            self.messages = []
+        self.messages.append(messageParts)
         reactor.callLater(0.1, self.reply, messageId, *messageParts)
 
 
+class ZmqDropFirstREPConnection(ZmqREPConnection):
+    def gotMessage(self, messageId, *messageParts):
+        if not hasattr(self, 'messages'):
+            self.messages = []
+        self.messages.append(messageParts)
+        if len(self.messages) > 1:
+            self.reply(messageId, *messageParts)
+
+
+class ZmqTimerWheelREQConnection(ZmqREQConnection):
+    requestTimeoutResolution = 0.01
+
+
+class ZmqFastIdREQConnection(ZmqREQConnection):
+    fastMessageIds = True
+
+
+class ZmqWindowREQConnection(ZmqREQConnection):
+    maxInFlight = 1
+
+
+class ZmqWindowRetryREQConnection(ZmqREQConnection):
+    maxInFlight = 1
+    maxRetries = 1
+
+
+class ZmqBatchREQConnection(ZmqREQConnection):
+    batchSize = 3
+
+
+class ZmqHedgeREQConnection(ZmqREQConnection):
+    hedgeDelay = 0.02
+
+
+class ZmqRetryREQConnection(ZmqREQConnection):
+    maxRetries = 2
+
+
+class ZmqAutoREPConnection(ZmqREPConnection):
+    autoReply = True
+    maxConcurrentRequests = 2
+    active = 0
+    maxActive = 0
+
+    def gotMessage(self, messageId, message):
+        if message == b'fail':
+            raise ValueError(message)
+
+        if message == b'sync':
+            return [b'sync', b'reply']
+
+        self.active += 1
+        self.maxActive = max(self.maxActive, self.active)
+
+        def done(_):
+            self.active -= 1
+            return b'reply ' + message
+
+        return _wait(0.01).addCallback(done)
+
+
+class ZmqThreadREPConnection(ZmqREPConnection):
+    autoReply = True
+
+    def gotMessage(self, messageId, message):
+        assert threading.current_thread() is not self.mainThread
+        return message.upper()
+
+
 class ZmqREQREPConnectionTestCase(unittest.TestCase):
     """
     Test case for L{zmq.req_rep.ZmqREPConnection}.
@@ -54,6 +136,32 @@ class ZmqREQREPConnectionTestCase(unittest.TestCase):
         ids = [self.s._getNextId() for _ in range(1000)]
         self.failUnlessEqual(len(ids), len(set(ids)))
 
+    def test_getNextId_fast(self):
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#3")
+        s = ZmqFastIdREQConnection(self.factory, c)
+
+        id1 = s._getNextId()
+        self.failUnlessIsInstance(id1, binary_string_type)
+        self.failUnlessEqual(16, len(id1))
+
+        id2 = s._getNextId()
+        self.failUnlessEqual(unpackMessageId(id1)[0], unpackMessageId(id2)[0])
+        self.failUnlessEqual(unpackMessageId(id1)[1] + 1,
+                             unpackMessageId(id2)[1])
+
+        s._releaseId(id2)
+        self.failIfEqual(id2, s._getNextId())
+
+        other = ZmqFastIdREQConnection(self.factory, c)
+        self.failIfEqual(id1, other._getNextId())
+
+    def test_send_recv_reply_fast_ids(self):
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#3")
+        s = ZmqFastIdREQConnection(self.factory, c)
+
+        return s.sendMsg(b'aaa').addCallback(
+            lambda response: self.assertEqual(response, [b'aaa']))
+
     def test_releaseId(self):
         self.s._releaseId(self.s._getNextId())
         self.failUnlessEqual(self.s.UUID_POOL_GEN_SIZE, len(self.s._uuids))
@@ -139,6 +247,201 @@ class ZmqREQREPConnectionTestCase(unittest.TestCase):
             .addCallback(check_requests) \
             .addCallback(lambda _: _wait(0.01))
 
+    def test_max_in_flight(self):
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#3")
+        s = ZmqWindowREQConnection(self.factory, c)
+
+        ds = [s.sendMsg(b'a'), s.sendMsg(b'b', priority=5),
+              s.sendMsg(b'c', priority=1)]
+        self.failUnlessEqual(2, s.pendingRequests)
+        self.failUnlessEqual(2, s.requestsQueued)
+
+        def check(responses):
+            self.failUnlessEqual([[b'a'], [b'b'], [b'c']],
+                                 [response for _, response in responses])
+            result = [parts for _, parts in self.r.messages]
+            self.failUnlessEqual([(b'a',), (b'c',), (b'b',)], result)
+            self.failUnlessEqual(0, s.pendingRequests)
+            self.failUnlessEqual({}, s._requests)
+            self.failUnless(s.requestQueueMaxWaitTime > 0)
+
+        return defer.DeferredList(ds, fireOnOneErrback=True) \
+            .addCallback(check)
+
+    def test_max_in_flight_cancel(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        r = ZmqSlowREPConnection(self.factory, b)
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s = ZmqWindowREQConnection(self.factory, c)
+
+        d1 = s.sendMsg(b'a')
+        d2 = s.sendMsg(b'b')
+        d3 = s.sendMsg(b'c', timeout=0.01)
+        d2.cancel()
+        self.failUnlessEqual(1, s.pendingRequests)
+
+        self.failUnlessFailure(d2, defer.CancelledError)
+        self.failUnlessFailure(d3, ZmqRequestTimeoutError)
+
+        def check(_):
+            self.failUnlessEqual([(b'a',)], r.messages)
+            self.failUnlessEqual(0, s.pendingRequests)
+
+        return defer.DeferredList([d1, d2, d3], fireOnOneErrback=True) \
+            .addCallback(check)
+
+    def test_max_in_flight_shutdown(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        ZmqSilentREPConnection(self.factory, b)
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s = ZmqWindowREQConnection(self.factory, c)
+
+        d1 = s.sendMsg(b'a', timeout=0.05)
+        d2 = s.sendMsg(b'b', timeout=0.05)
+        d3 = s.sendMsg(b'c')
+        s.shutdown()
+
+        self.failUnlessEqual(0, s.pendingRequests)
+        self.failUnlessFailure(d1, ZmqRequestTimeoutError)
+        self.failUnlessFailure(d2, defer.CancelledError)
+        self.failUnlessFailure(d3, defer.CancelledError)
+
+        return defer.DeferredList([d1, d2, d3])
+
+    def test_batch(self):
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#3")
+        s = ZmqBatchREQConnection(self.factory, c)
+
+        ds = [s.sendMsg(b'msg%d' % i, b'part') for i in range(7)]
+        cancelled = s.sendMsg(b'cancelled')
+        cancelled.cancel()
+        self.failUnlessFailure(cancelled, defer.CancelledError)
+
+        def check(responses):
+            self.failUnlessEqual(
+                [[b'msg%d' % i, b'part'] for i in range(7)],
+                [response for _, response in responses])
+            self.failUnlessEqual(
+                [(b'msg%d' % i, b'part') for i in range(7)],
+                [parts for _, parts in self.r.messages])
+            self.failUnlessEqual({}, s._requests)
+            self.failUnlessEqual({}, self.r._routingInfo)
+
+        return defer.DeferredList(ds + [cancelled], fireOnOneErrback=True) \
+            .addCallback(lambda _: defer.DeferredList(ds)) \
+            .addCallback(check)
+
+    def test_batch_shutdown(self):
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#3")
+        s = ZmqBatchREQConnection(self.factory, c)
+
+        d = s.sendMsg(b'a')
+        s.shutdown()
+
+        self.failUnlessEqual([], s._batch)
+        self.failUnlessEqual({}, s._requests)
+        return self.failUnlessFailure(d, defer.CancelledError)
+
+    def test_batch_pack_unpack(self):
+        requests = [(b'id1', [b'a', b'']), (b'id2', []), (b'id3', [b'c'])]
+        self.failUnlessEqual(requests, _unpackBatch(_packBatch(requests)))
+
+    def test_hedge(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        r = ZmqDropFirstREPConnection(self.factory, b)
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s = ZmqHedgeREQConnection(self.factory, c)
+
+        def check(response):
+            self.failUnlessEqual([b'aaa'], response)
+            self.failUnlessEqual([(b'aaa',), (b'aaa',)], r.messages)
+            self.failUnlessEqual(1, s.requestsHedged)
+            self.failUnlessEqual({}, s._requests)
+            self.failUnlessEqual({}, s._states)
+
+        return s.sendMsg(b'aaa', timeout=1.0).addCallback(check)
+
+    def test_hedge_percentile(self):
+        s = ZmqHedgeREQConnection(self.factory)
+        s.hedgePercentile = 95
+        s.latencyMinSamples = 10
+
+        for i in range(9):
+            s._recordLatency(i / 100.0)
+        self.failUnlessEqual(0.02, s._currentHedgeDelay())
+
+        for i in range(9, 100):
+            s._recordLatency(i / 100.0)
+        self.failUnlessApproximates(0.95, s._currentHedgeDelay(), 0.011)
+
+    def test_retry(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        r = ZmqDropFirstREPConnection(self.factory, b)
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s = ZmqRetryREQConnection(self.factory, c)
+
+        def check(response):
+            self.failUnlessEqual([b'aaa'], response)
+            self.failUnlessEqual(2, len(r.messages))
+            self.failUnlessEqual(1, s.requestsRetried)
+            self.failUnlessEqual({}, s._requests)
+            self.failUnlessEqual({}, s._states)
+
+        return s.sendMsg(b'aaa', timeout=0.05).addCallback(check)
+
+    def test_retry_max_in_flight(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        r = ZmqSlowREPConnection(self.factory, b)
+        r.gotMessage = lambda messageId, *parts: r.messages.append(parts)
+        r.messages = []
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s = ZmqWindowRetryREQConnection(self.factory, c)
+
+        inFlight = []
+        sendRequest = s._sendRequest
+
+        def _sendRequest(messageId, messageParts):
+            sendRequest(messageId, messageParts)
+            inFlight.append(s._inFlight())
+        s._sendRequest = _sendRequest
+
+        ds = [s.sendMsg(b'req%d' % i, timeout=0.05) for i in range(5)]
+        for d in ds:
+            self.failUnlessFailure(d, ZmqRequestTimeoutError)
+
+        def check(_):
+            # requests timed out in local queue aren't retried
+            self.failUnlessEqual(1, s.requestsRetried)
+            self.failUnlessEqual([(b'req0',), (b'req0',)], r.messages)
+            self.failUnlessEqual([1, 1], inFlight)
+            self.failUnlessEqual(0, s._inFlight())
+            self.failUnlessEqual(0, s.pendingRequests)
+
+        return defer.DeferredList(ds).addCallback(lambda _: _wait(0.02)) \
+            .addCallback(check)
+
+    def test_retry_budget_exhausted(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        ZmqSilentREPConnection(self.factory, b)
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s = ZmqRetryREQConnection(self.factory, c)
+        s._retryTokens = 0.0
+        s.retryBudget = 0.5
+
+        def check(_):
+            self.failUnlessEqual(1, s.requestsRetried)
+            self.failUnlessEqual(1, s.retryBudgetExhausted)
+            self.failUnlessEqual({}, s._requests)
+            self.failUnlessEqual({}, s._states)
+
+        d = s.sendMsg(b'aaa', timeout=0.02)
+        d2 = s.sendMsg(b'bbb', timeout=0.02)
+        d2.cancel()
+        return self.failUnlessFailure(d, ZmqRequestTimeoutError) \
+            .addCallback(lambda _: self.failUnlessFailure(
+                d2, defer.CancelledError)) \
+            .addCallback(check)
+
     def test_send_timeout_ok(self):
         return self.s.sendMsg(b'aaa', timeout=0.1).addCallback(
             lambda response: self.assertEquals(response, [b'aaa'])
@@ -155,6 +458,165 @@ class ZmqREQREPConnectionTestCase(unittest.TestCase):
                           lambda fail: fail.trap(ZmqRequestTimeoutError)) \
             .addCallback(lambda _: _wait(0.1))
 
+    def test_send_timeout_fail_timer_wheel(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        ZmqSlowREPConnection(self.factory, b)
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s = ZmqTimerWheelREQConnection(self.factory, c, identity=b'client2')
+        self.failUnlessIsInstance(s._timeouts, TimerWheel)
+
+        return s.sendMsg(b'aaa', timeout=0.05) \
+            .addCallbacks(lambda _: self.fail("Should timeout"),
+                          lambda fail: fail.trap(ZmqRequestTimeoutError)) \
+            .addCallback(lambda _: self.assertEqual(s._requests, {})) \
+            .addCallback(lambda _: _wait(0.1))
+
+    def test_shutdown_timeout(self):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#4")
+        ZmqSilentREPConnection(self.factory, b)
+        c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#4")
+        s1 = ZmqREQConnection(self.factory, c)
+        s2 = ZmqTimerWheelREQConnection(self.factory, c)
+        s3 = ZmqRetryREQConnection(self.factory, c)
+
+        ds = [s.sendMsg(b'aaa', timeout=0.05) for s in (s1, s2, s3)]
+        for s in (s1, s2, s3):
+            s.shutdown()
+
+        for d in ds:
+            self.failUnlessFailure(d, ZmqRequestTimeoutError)
+
+        return defer.DeferredList(ds).addCallback(lambda _: _wait(0.05))
+
+
+class ZmqREPRoutingInfoTestCase(unittest.TestCase):
+    """
+    Test case for L{zmq.req_rep.ZmqREPConnection} routing info eviction.
+    """
+
+    def setUp(self):
+        self.factory = ZmqFactory()
+        self.r = ZmqSilentREPConnection(self.factory)
+
+    def tearDown(self):
+        self.factory.shutdown()
+
+    def test_max_size(self):
+        self.r.routingInfoMaxSize = 2
+
+        for i in range(3):
+            self.r.messageReceived([b'peer', str(i).encode(), b'', b'req'])
+
+        self.failUnlessEqual([b'1', b'2'], list(self.r._routingInfo))
+        self.failUnlessEqual(1, self.r.routingInfoEvicted)
+        self.failUnlessRaises(ZmqUnknownRequestError, self.r.reply, b'0')
+        self.failUnlessRaises(KeyError, self.r.reply, b'unknown')
+
+    def test_ttl(self):
+        self.r.routingInfoTTL = 0.01
+
+        self.r.messageReceived([b'peer', b'0', b'', b'req'])
+        self.r.messageReceived([b'peer', b'1', b'', b'req'])
+
+        def check(_):
+            self.failUnlessRaises(ZmqUnknownRequestError, self.r.reply, b'0')
+            self.failUnlessEqual(1, self.r.routingInfoEvicted)
+
+            self.r.messageReceived([b'peer', b'2', b'', b'req'])
+            self.failUnlessEqual([b'2'], list(self.r._routingInfo))
+            self.failUnlessEqual(2, self.r.routingInfoEvicted)
+
+        return _wait(0.02).addCallback(check)
+
+
+class ZmqAutoReplyTestCase(unittest.TestCase):
+    """
+    Test case for L{zmq.req_rep.ZmqREPConnection} with autoReply enabled.
+    """
+
+    def setUp(self):
+        self.factory = ZmqFactory()
+
+    def _connect(self):
+        self.s = ZmqREQConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "ipc://#5"))
+
+    def tearDown(self):
+        self.factory.shutdown()
+
+    def test_auto_reply(self):
+        r = ZmqAutoREPConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "ipc://#5"))
+        self._connect()
+
+        ds = [self.s.sendMsg(str(i).encode()) for i in range(6)]
+        ds.append(self.s.sendMsg(b'sync'))
+
+        def check(responses):
+            expected = [[b'reply ' + str(i).encode()] for i in range(6)]
+            expected.append([b'sync', b'reply'])
+            self.failUnlessEqual(expected,
+                                 [response for _, response in responses])
+            self.failUnlessEqual(2, r.maxActive)
+            self.failUnlessEqual({}, r._routingInfo)
+            self.failIf(r.readingPaused)
+
+        return defer.DeferredList(ds, fireOnOneErrback=True) \
+            .addCallback(check)
+
+    def test_auto_reply_pause(self):
+        r = ZmqAutoREPConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "ipc://#5"))
+        self._connect()
+
+        ds = [self.s.sendMsg(str(i).encode()) for i in range(3)]
+
+        def paused(_):
+            # paused by concurrency limit
+            self.failUnless(r._handlersPaused)
+            r.pauseProducing()
+            r.resumeProducing()
+            self.failUnless(r.readingPaused)
+            r.pauseProducing()
+            return defer.DeferredList(ds, fireOnOneErrback=True)
+
+        def done(_):
+            # concurrency limit is lifted, but consumer still holds pause
+            self.failIf(r._handlersPaused)
+            self.failUnless(r.readingPaused)
+            r.resumeProducing()
+            self.failIf(r.readingPaused)
+
+        return _wait(0.005).addCallback(paused).addCallback(done)
+
+    def test_auto_reply_failure(self):
+        r = ZmqAutoREPConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "ipc://#5"))
+        self._connect()
+
+        d = self.s.sendMsg(b'fail', timeout=0.1)
+
+        def check(_):
+            self.failUnlessEqual(1, len(self.flushLoggedErrors(ValueError)))
+            self.failUnlessEqual({}, r._routingInfo)
+
+        return self.failUnlessFailure(d, ZmqRequestTimeoutError) \
+            .addCallback(check)
+
+    def test_auto_reply_thread_pool(self):
+        pool = ThreadPool(minthreads=1, maxthreads=2)
+        pool.start()
+        self.addCleanup(pool.stop)
+
+        r = ZmqThreadREPConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, "ipc://#5"))
+        self._connect()
+        r.mainThread = threading.current_thread()
+        r.threadPool = pool
+
+        return self.s.sendMsg(b'abc').addCallback(
+            self.assertEqual, [b'ABC'])
+
 
 class ZmqReplyConnection(ZmqREPConnection):
     def messageReceived(self, message):
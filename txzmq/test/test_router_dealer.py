@@ -6,7 +6,11 @@ from twisted.trial import unittest
 
 from txzmq.connection import ZmqEndpoint, ZmqEndpointType
 from txzmq.factory import ZmqFactory
-from txzmq.router_dealer import ZmqRouterConnection, ZmqDealerConnection
+from txzmq.req_rep import ZmqRequestTimeoutError
+from txzmq.router_dealer import ZmqRouterConnection, ZmqDealerConnection, \
+    ZmqLoadBalancingConnection, ZmqNoPeersError, ZmqPeerSelection, \
+    ZmqWorkerConnection
+from txzmq.test import _wait
 
 
 class ZmqTestRouterConnection(ZmqRouterConnection):
@@ -36,6 +40,108 @@ class ZmqTestDealerConnection(ZmqDealerConnection):
             assert False, "received unexpected message: %r" % (message,)
 
 
+class ZmqTestWorkerConnection(ZmqWorkerConnection):
+    delay = 0
+    count = 0
+
+    def gotMessage(self, messageId, *messageParts):
+        self.count += 1
+        if self.delay is None:
+            return
+        reactor.callLater(self.delay, self.reply, messageId,
+                          self.identity, *messageParts)
+
+
+class ZmqLeastLoadedConnection(ZmqLoadBalancingConnection):
+    peerSelection = ZmqPeerSelection.leastLoaded
+
+
+class ZmqLoadBalancingTestCase(unittest.TestCase):
+    """
+    Test case for L{txzmq.router_dealer.ZmqLoadBalancingConnection}.
+    """
+
+    def setUp(self):
+        self.factory = ZmqFactory()
+
+    def tearDown(self):
+        self.factory.shutdown()
+
+    def _start(self, clientClass, delays):
+        b = ZmqEndpoint(ZmqEndpointType.bind, "ipc://#8")
+        client = clientClass(self.factory, b)
+        workers = []
+        for i, delay in enumerate(delays):
+            c = ZmqEndpoint(ZmqEndpointType.connect, "ipc://#8")
+            worker = ZmqTestWorkerConnection(
+                self.factory, c, identity=b'worker%d' % i)
+            worker.delay = delay
+            workers.append(worker)
+
+        return _wait(0.05).addCallback(lambda _: (client, workers))
+
+    @defer.inlineCallbacks
+    def _sendSequentially(self, client, count):
+        for i in range(count):
+            reply = yield client.sendRequest(b'req')
+            self.failUnlessEqual(b'req', reply[1])
+
+    @defer.inlineCallbacks
+    def _test_prefers_fast_peer(self, clientClass):
+        client, (slow, fast) = yield self._start(clientClass, [0.03, 0])
+        self.failUnlessEqual({b'worker0', b'worker1'}, set(client.peers))
+
+        yield self._sendSequentially(client, 30)
+
+        self.failUnlessEqual(30, slow.count + fast.count)
+        self.failUnless(slow.count <= 3, slow.count)
+        self.failUnlessEqual(0, client.peers[b'worker0'].outstanding)
+        self.failUnless(client.peers[b'worker0'].latency >
+                        client.peers[b'worker1'].latency)
+
+    def test_prefers_fast_peer(self):
+        return self._test_prefers_fast_peer(ZmqLoadBalancingConnection)
+
+    def test_prefers_fast_peer_least_loaded(self):
+        return self._test_prefers_fast_peer(ZmqLeastLoadedConnection)
+
+    def test_multiple_clients(self):
+        clients = [ZmqLoadBalancingConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.bind, address))
+            for address in ("ipc://#8", "ipc://#13")]
+        worker = ZmqTestWorkerConnection(
+            self.factory, ZmqEndpoint(ZmqEndpointType.connect, "ipc://#8"),
+            identity=b'worker0')
+        worker.addEndpoints([
+            ZmqEndpoint(ZmqEndpointType.connect, "ipc://#13")])
+
+        def check(_):
+            for client in clients:
+                self.failUnlessEqual([b'worker0'], list(client.peers))
+
+        return _wait(0.05).addCallback(check)
+
+    def test_no_peers(self):
+        client = ZmqLoadBalancingConnection(self.factory)
+        return self.failUnlessFailure(client.sendRequest(b'req'),
+                                      ZmqNoPeersError)
+
+    @defer.inlineCallbacks
+    def test_timeout(self):
+        client, (worker,) = yield self._start(ZmqLoadBalancingConnection,
+                                              [None])
+
+        yield self.failUnlessFailure(
+            client.sendRequest(b'req', timeout=0.01), ZmqRequestTimeoutError)
+        self.failUnlessEqual(1, worker.count)
+        self.failUnlessEqual({}, client._requests)
+        self.failUnlessEqual(0.01, client.peers[b'worker0'].latency)
+
+        client.removePeer(b'worker0')
+        yield self.failUnlessFailure(client.sendRequest(b'req'),
+                                     ZmqNoPeersError)
+
+
 class ZmqRouterDealerTwoFactoryConnectionTestCase(unittest.TestCase):
     """
     Test case for L{txzmq.req_rep} with ROUTER/DEALER in two factories.
@@ -0,0 +1,69 @@
+"""
+Tests for L{txzmq.timerwheel}.
+"""
+from twisted.internet.task import Clock
+from twisted.trial import unittest
+
+from txzmq.timerwheel import TimerWheel
+
+
+class TimerWheelTestCase(unittest.TestCase):
+    """
+    Test case for L{txzmq.timerwheel.TimerWheel}.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.wheel = TimerWheel(self.clock, resolution=0.1)
+        self.fired = []
+
+    def test_callLater(self):
+        self.wheel.callLater(0.25, self.fired.append, 1)
+        self.wheel.callLater(0.55, self.fired.append, 2)
+        self.wheel.callLater(0.25, self.fired.append, 3)
+        self.failUnlessEqual(3, len(self.wheel))
+        self.failUnlessEqual(1, len(self.clock.getDelayedCalls()))
+
+        self.clock.advance(0.2)
+        self.failUnlessEqual([], self.fired)
+
+        self.clock.advance(0.1)
+        self.failUnlessEqual([1, 3], sorted(self.fired))
+
+        self.clock.advance(0.3)
+        self.failUnlessEqual([1, 2, 3], sorted(self.fired))
+        self.failUnlessEqual(0, len(self.wheel))
+        self.failUnlessEqual([], self.clock.getDelayedCalls())
+
+    def test_cancel(self):
+        call1 = self.wheel.callLater(0.25, self.fired.append, 1)
+        call2 = self.wheel.callLater(0.25, self.fired.append, 2)
+        self.failUnless(call1.active())
+
+        call1.cancel()
+        self.failIf(call1.active())
+        self.failUnlessEqual(1, len(self.wheel))
+
+        self.clock.advance(0.3)
+        self.failUnlessEqual([2], self.fired)
+        self.failIf(call2.active())
+
+        call3 = self.wheel.callLater(1, self.fired.append, 3)
+        call3.cancel()
+        self.failUnlessEqual([], self.clock.getDelayedCalls())
+
+    def test_late_tick(self):
+        self.wheel.callLater(0.1, self.fired.append, 1)
+        self.wheel.callLater(50, self.fired.append, 2)
+
+        self.clock.advance(10)
+        self.failUnlessEqual([1], self.fired)
+        self.clock.advance(100)
+        self.failUnlessEqual([1, 2], self.fired)
+
+    def test_stop(self):
+        call = self.wheel.callLater(0.25, self.fired.append, 1)
+        self.wheel.stop()
+
+        self.failIf(call.active())
+        self.failUnlessEqual([], self.clock.getDelayedCalls())
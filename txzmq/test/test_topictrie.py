@@ -0,0 +1,51 @@
+"""
+Tests for L{txzmq.topictrie}.
+"""
+from twisted.trial import unittest
+
+from txzmq.topictrie import TopicTrie
+
+
+class TopicTrieTestCase(unittest.TestCase):
+    """
+    Test case for L{txzmq.topictrie.TopicTrie}.
+    """
+
+    def setUp(self):
+        self.trie = TopicTrie()
+
+    def test_match(self):
+        self.trie.add(b'', 'all')
+        self.trie.add(b'a', 'a')
+        self.trie.add(b'ab', 'ab')
+        self.trie.add(b'ab', 'ab2')
+        self.trie.add(b'b', 'b')
+        self.failUnlessEqual(5, len(self.trie))
+
+        self.failUnlessEqual(['all', 'a', 'ab', 'ab2'],
+                             self.trie.match(b'abc'))
+        self.failUnlessEqual(['all', 'a'], self.trie.match(b'ac'))
+        self.failUnlessEqual(['all', 'b'], self.trie.match(b'b'))
+        self.failUnlessEqual(['all'], self.trie.match(b''))
+
+    def test_remove(self):
+        self.trie.add(b'abc', 'abc')
+        self.trie.add(b'a', 'a')
+        self.trie.add(b'abc', 'abc')
+
+        self.trie.remove(b'abc', 'abc')
+        self.failUnlessEqual(['a', 'abc'], self.trie.match(b'abcd'))
+
+        self.trie.remove(b'abc', 'abc')
+        self.failUnlessEqual(['a'], self.trie.match(b'abcd'))
+        self.failUnlessEqual({}, self.trie.root.children[ord('a')].children)
+
+        self.trie.remove(b'a', 'a')
+        self.failUnlessEqual({}, self.trie.root.children)
+        self.failUnlessEqual(0, len(self.trie))
+
+    def test_remove_unknown(self):
+        self.trie.add(b'ab', 'ab')
+        self.failUnlessRaises(KeyError, self.trie.remove, b'abc', 'ab')
+        self.failUnlessRaises(KeyError, self.trie.remove, b'ab', 'a')
+        self.failUnlessEqual(1, len(self.trie))
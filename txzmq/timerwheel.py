@@ -0,0 +1,170 @@
+"""
+Timer wheel: scheduling many timeouts with single reactor timer.
+"""
+import math
+
+from twisted.python import log
+
+
+class TimerWheelCall(object):
+    """
+    Call scheduled via :meth:`TimerWheel.callLater`.
+
+    Mimics :class:`twisted.internet.base.DelayedCall` interface:
+    :meth:`active` and :meth:`cancel`.
+    """
+    __slots__ = ('wheel', 'bucket', 'func', 'args', 'called', 'cancelled')
+
+    def __init__(self, wheel, bucket, func, args):
+        self.wheel = wheel
+        self.bucket = bucket
+        self.func = func
+        self.args = args
+        self.called = False
+        self.cancelled = False
+
+    def active(self):
+        """
+        Has call neither been called nor cancelled yet?
+
+        :rtype: bool
+        """
+        return not (self.called or self.cancelled)
+
+    def cancel(self):
+        """
+        Cancel the call.
+        """
+        if self.active():
+            self.cancelled = True
+            self.wheel._cancel(self)
+
+
+class TimerWheel(object):
+    """
+    Timer wheel (bucketed deadline scheduler).
+
+    Deadlines are rounded up to multiple of `resolution` and calls with
+    the same rounded deadline are kept in one bucket. Single reactor timer
+    ticks every `resolution` seconds (only while there are calls scheduled)
+    and expires all the due buckets at once, so scheduling and cancelling
+    a call is O(1) and doesn't touch reactor timed call heap.
+
+    Calls are never fired early, but could be fired up to `resolution`
+    seconds late.
+
+    :var reactor: Twisted reactor used for ticking
+    :var resolution: tick interval (seconds)
+    :vartype resolution: float
+    """
+
+    def __init__(self, reactor, resolution=0.01):
+        """
+        Constructor.
+
+        :param reactor: Twisted reactor
+        :param resolution: tick interval (seconds)
+        :type resolution: float
+        """
+        self.reactor = reactor
+        self.resolution = resolution
+        self.buckets = {}
+        self.count = 0
+        self.last_bucket = 0
+        self.tick_call = None
+
+    def __len__(self):
+        return self.count
+
+    def callLater(self, delay, func, *args):
+        """
+        Schedule `func` to be called after `delay` seconds.
+
+        :param delay: delay in seconds
+        :type delay: float
+        :param func: function to call
+        :return: scheduled call
+        :rtype: :class:`TimerWheelCall`
+        """
+        now = self.reactor.seconds()
+
+        if self.tick_call is None:
+            self.last_bucket = int(now / self.resolution)
+            self.tick_call = self.reactor.callLater(
+                self.resolution, self._tick)
+
+        bucket = max(int(math.ceil((now + delay) / self.resolution)),
+                     self.last_bucket + 1)
+        call = TimerWheelCall(self, bucket, func, args)
+        self.buckets.setdefault(bucket, set()).add(call)
+        self.count += 1
+        return call
+
+    def stop(self):
+        """
+        Stop ticking, drop all scheduled calls.
+        """
+        if self.tick_call is not None:
+            self.tick_call.cancel()
+            self.tick_call = None
+
+        for calls in self.buckets.values():
+            for call in calls:
+                call.cancelled = True
+        self.buckets = {}
+        self.count = 0
+
+    def _cancel(self, call):
+        """
+        Remove cancelled call from its bucket.
+        """
+        calls = self.buckets.get(call.bucket)
+        if calls is None:
+            return
+
+        calls.discard(call)
+        if not calls:
+            del self.buckets[call.bucket]
+        self.count -= 1
+
+        if self.count == 0 and self.tick_call is not None:
+            self.tick_call.cancel()
+            self.tick_call = None
+
+    def _tick(self):
+        """
+        Fire all calls which deadline has passed.
+        """
+        self.tick_call = None
+
+        now = self.reactor.seconds()
+        # compensate for floating point error when ticking exactly
+        # on bucket boundary
+        now_bucket = int(now / self.resolution + 1e-9)
+
+        if now_bucket - self.last_bucket > len(self.buckets):
+            due = sorted(bucket for bucket in self.buckets
+                         if bucket <= now_bucket)
+        else:
+            due = range(self.last_bucket + 1, now_bucket + 1)
+        self.last_bucket = max(now_bucket, self.last_bucket)
+
+        for bucket in due:
+            calls = self.buckets.pop(bucket, None)
+            if not calls:
+                continue
+
+            self.count -= len(calls)
+            for call in calls:
+                if call.cancelled:  # cancelled by one of previous calls
+                    continue
+                call.called = True
+                try:
+                    call.func(*call.args)
+                except Exception:
+                    log.err(None, "Error in timer wheel call %r" % (
+                        call.func,))
+
+        if self.count and self.tick_call is None:
+            self.tick_call = self.reactor.callLater(
+                (self.last_bucket + 1) * self.resolution - now, self._tick)
@@ -0,0 +1,95 @@
+"""
+Prefix trie mapping topic prefixes to handlers.
+"""
+
+
+class _TrieNode(object):
+    __slots__ = ('children', 'handlers')
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = []
+
+
+class TopicTrie(object):
+    """
+    Prefix trie of topic handlers.
+
+    Handlers are registered for topic prefixes (the same way ZeroMQ
+    subscriptions work), matching all the handlers for a topic takes
+    O(len(topic)) regardless of number of registered prefixes.
+    """
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, prefix, handler):
+        """
+        Register `handler` for topics starting with `prefix`.
+
+        Same handler could be registered several times.
+
+        :param prefix: topic prefix
+        :type prefix: str
+        :param handler: handler
+        """
+        node = self.root
+        for char in bytearray(prefix):
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+
+        node.handlers.append(handler)
+        self.count += 1
+
+    def remove(self, prefix, handler):
+        """
+        Unregister `handler` registered for `prefix` (once).
+
+        :param prefix: topic prefix
+        :type prefix: str
+        :param handler: handler
+        :raises KeyError: if handler isn't registered for prefix
+        """
+        path = [self.root]
+        for char in bytearray(prefix):
+            node = path[-1].children.get(char)
+            if node is None:
+                raise KeyError(prefix)
+            path.append(node)
+
+        try:
+            path[-1].handlers.remove(handler)
+        except ValueError:
+            raise KeyError(prefix)
+        self.count -= 1
+
+        # prune empty nodes
+        chars = bytearray(prefix)
+        for i in range(len(chars), 0, -1):
+            node = path[i]
+            if node.handlers or node.children:
+                break
+            del path[i - 1].children[chars[i - 1]]
+
+    def match(self, topic):
+        """
+        Find handlers registered for prefixes of `topic`.
+
+        :param topic: topic
+        :type topic: str
+        :return: list of handlers, shorter prefixes first
+        """
+        node = self.root
+        handlers = list(node.handlers)
+        for char in bytearray(topic):
+            node = node.children.get(char)
+            if node is None:
+                break
+            handlers.extend(node.handlers)
+        return handlers